@@ -1,24 +1,76 @@
+import time
+import asyncio
+
 from loguru import logger
 from telegram import Update
 from telegram.ext import Application
 
 from .database import Database
+from .webhook import WebhookServer
+from .config import CONFIG
 from .config.secrets import TELEGRAM_TOKEN
-from .config.services import SERVICES
+from .config.services import SERVICES, SCHEDULER
+from .session_database import SessionDatabase
 from .tg_handler import get_clbk_handler, get_common_handlers
 from .tg_handler.auth import get_auth_handler
+from .tg_handler.inline import get_inline_handler
+from .tg_handler.send_queue import SEND_QUEUE
+from .tg_handler.posters import POSTERS
+from .services.posters import PosterFetcher
+
+
+SESSION_MAX_AGE = 24 * 60 * 60
+SESSION_CLEANUP_INTERVAL = 60 * 60
+
+WEBHOOK = WebhookServer(SERVICES, **CONFIG["webhook"]) if CONFIG.get("webhook") else None
 
 
 def init():
     pass
 
 
+async def load_services(application):
+    logger.info("Loading services...")
+    started = time.monotonic()
+    await asyncio.gather(*[s.start(application) for s in SERVICES])
+    logger.info(f"Loaded services in {time.monotonic() - started:.2f}s")
+    SCHEDULER.start(application.job_queue)
+    if WEBHOOK:
+        await WEBHOOK.start(application)
+
+
+async def close_services(application):
+    if WEBHOOK:
+        await WEBHOOK.stop()
+    if POSTERS.fetcher:
+        await POSTERS.fetcher.close()
+    for s in SERVICES:
+        await s.close()
+
+
 def main():
     logger.info("Initializing database...")
     db = Database()
+    session_db = SessionDatabase()
+    POSTERS.load(db)
+    if CONFIG.get("posters", {}).get("local"):
+        options = {k: v for k, v in CONFIG["posters"].items() if k != "local"}
+        POSTERS.fetcher = PosterFetcher(**options)
+    SCHEDULER.register(
+        "session_cleanup",
+        lambda: asyncio.to_thread(session_db.clear_expired_sessions, SESSION_MAX_AGE),
+        SESSION_CLEANUP_INTERVAL,
+    )
 
     logger.info("Creating bot...")
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .rate_limiter(SEND_QUEUE)
+        .post_init(load_services)
+        .post_shutdown(close_services)
+        .build()
+    )
 
     logger.info("Registering auth command...")
     application.add_handler(get_auth_handler(db))
@@ -34,6 +86,9 @@ def main():
     logger.info("Registering callback handler...")
     application.add_handler(get_clbk_handler(SERVICES))
 
+    logger.info("Registering inline query handler...")
+    application.add_handler(get_inline_handler(SERVICES, db))
+
     logger.info("Start polling for messages..")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
@@ -97,6 +97,13 @@ def load_config_from_env():
     _inject_api_conf(config)
     _inject_service_conf(config)
 
+    if os.getenv("BUTLARR_WEBHOOK_PORT"):
+        config["webhook"] = {
+            "host": os.getenv("BUTLARR_WEBHOOK_HOST", "127.0.0.1"),
+            "port": int(os.getenv("BUTLARR_WEBHOOK_PORT")),
+            "secret": os.getenv("BUTLARR_WEBHOOK_SECRET"),
+        }
+
     # Clean up commands, to not include empty elements
     for s in config["services"]:
         s["commands"] = list(filter(bool, s["commands"]))
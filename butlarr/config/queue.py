@@ -1,2 +1,7 @@
 WIDTH = 20
 PAGE_SIZE = 10
+# Live queue view: polling interval bounds (seconds), inactivity timeout and records polled
+WATCH_MIN_INTERVAL = 5
+WATCH_MAX_INTERVAL = 60
+WATCH_TIMEOUT = 15 * 60
+WATCH_MAX_RECORDS = 250
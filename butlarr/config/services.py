@@ -1,9 +1,12 @@
 import importlib
 
 from . import CONFIG
+from ..services.client import ClientConfig
+from ..scheduler import Scheduler
 
 APIS = CONFIG["apis"]
 SERVICES = []
+SCHEDULER = Scheduler()
 
 for service in CONFIG["services"]:
     try:
@@ -19,6 +22,15 @@ for service in CONFIG["services"]:
         "commands": service["commands"],
         "api_host": api_config["api_host"],
         "api_key": api_config["api_key"],
+        "http_config": ClientConfig.from_config(
+            CONFIG.get("http"), api_config.get("http")
+        ),
     }
 
     SERVICES.append(ServiceConstructor(**args))
+
+for service in SERVICES:
+    if CONFIG.get("webhook"):
+        # Library changes are pushed by the arr, polling only catches missed events
+        service.library_sync_interval = service.webhook_library_sync_interval
+    service.register_jobs(SCHEDULER)
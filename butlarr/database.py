@@ -40,6 +40,8 @@ class Database:
         # Make sure the file exists
         self.db_file.parent.mkdir(exist_ok=True, parents=True)
         self.db_file.touch(exist_ok=True)
+        # Auth level per user id (None if unknown), kept in sync by the user methods
+        self.auth_levels = {}
         # Initialize the db
         self._init_db()
 
@@ -51,6 +53,16 @@ class Database:
                 username text not null,
                 auth_level integer
             );""",
+            """CREATE TABLE IF NOT EXISTS subscriptions (
+                chat_id integer not null,
+                service text not null,
+                primary key (chat_id, service)
+            );""",
+            """CREATE TABLE IF NOT EXISTS posters (
+                url text primary key,
+                file_id text,
+                failed_at real
+            );""",
         ]
         for q in queries:
             logger.debug(f"Executing query: [{q}] with no args...")
@@ -81,6 +93,7 @@ class Database:
         (_, con) = self._execute_query(q, qa)
         con.commit()
         con.close()
+        self.auth_levels[id] = auth_level
 
     def remove_user(self, id):
         q = "DELETE FROM users where id=?;"
@@ -88,6 +101,7 @@ class Database:
         (_, con) = self._execute_query(q, qa)
         con.commit()
         con.close()
+        self.auth_levels[id] = None
 
     def get_users(
         self,
@@ -112,8 +126,16 @@ class Database:
         (_, con) = self._execute_query(q, qa)
         con.commit()
         con.close()
+        # Unknown users are not updated, so look the level up again
+        self.auth_levels.pop(user_id, None)
 
     def get_auth_level(self, user_id):
+        if user_id in self.auth_levels:
+            return self.auth_levels[user_id]
+        self.auth_levels[user_id] = self._get_auth_level(user_id)
+        return self.auth_levels[user_id]
+
+    def _get_auth_level(self, user_id):
         q = "SELECT * FROM users WHERE id=?;"
         qa = (user_id,)
         (r, con) = self._execute_query(q, qa)
@@ -126,3 +148,46 @@ class Database:
 
         logger.debug(f"Did not find user [{user_id}] in the database.")
         return None
+
+    def add_subscription(self, chat_id, service):
+        q = "INSERT OR IGNORE INTO subscriptions (chat_id, service) VALUES (?, ?);"
+        qa = (chat_id, service)
+        (_, con) = self._execute_query(q, qa)
+        con.commit()
+        con.close()
+
+    def remove_subscription(self, chat_id, service):
+        q = "DELETE FROM subscriptions where chat_id=? and service=?;"
+        qa = (chat_id, service)
+        (_, con) = self._execute_query(q, qa)
+        con.commit()
+        con.close()
+
+    def get_subscribers(self, service):
+        q = "SELECT chat_id FROM subscriptions WHERE service=?;"
+        qa = (service,)
+        (r, con) = self._execute_query(q, qa)
+        records = r.fetchall() if r else []
+        con.close()
+        return [record["chat_id"] for record in records]
+
+    def get_posters(self):
+        q = "SELECT * FROM posters;"
+        (r, con) = self._execute_query(q)
+        records = r.fetchall() if r else []
+        con.close()
+        return records
+
+    def set_poster(self, url, file_id=None, failed_at=None):
+        q = "INSERT OR REPLACE INTO posters (url, file_id, failed_at) VALUES (?, ?, ?);"
+        qa = (url, file_id, failed_at)
+        (_, con) = self._execute_query(q, qa)
+        con.commit()
+        con.close()
+
+    def remove_poster(self, url):
+        q = "DELETE FROM posters where url=?;"
+        qa = (url,)
+        (_, con) = self._execute_query(q, qa)
+        con.commit()
+        con.close()
@@ -0,0 +1,98 @@
+import time
+import random
+
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+from loguru import logger
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    skipped: int = 0
+    failures: int = 0
+    last_run: Optional[str] = None
+    last_duration: Optional[float] = None
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    callback: Callable[[], Awaitable[Any]]
+    interval: float
+    first: float
+    jitter: float
+    running: bool = False
+    stats: JobStats = None
+
+
+class Scheduler:
+    """
+    Runs registered periodic jobs on the applications job queue.
+    Each run is delayed by a random jitter and a run is skipped while the previous
+    run of the same job is still in progress.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self.job_queue = None
+
+    def register(
+        self,
+        name: str,
+        callback: Callable[[], Awaitable[Any]],
+        interval: float,
+        *,
+        first: Optional[float] = None,
+        jitter: float = 0.1,
+    ):
+        assert name not in self.jobs, f"Job {name} is already registered"
+        job = ScheduledJob(
+            name=name,
+            callback=callback,
+            interval=interval,
+            first=interval if first is None else first,
+            jitter=jitter,
+            stats=JobStats(),
+        )
+        self.jobs[name] = job
+        if self.job_queue:
+            self._schedule(job, job.first)
+        return job
+
+    def start(self, job_queue):
+        self.job_queue = job_queue
+        for job in self.jobs.values():
+            self._schedule(job, job.first)
+        logger.info(f"Scheduled {len(self.jobs)} periodic jobs")
+
+    def _schedule(self, job: ScheduledJob, delay: Optional[float] = None):
+        if delay is None:
+            delay = job.interval * (1 + random.uniform(-job.jitter, job.jitter))
+
+        async def run(context):
+            await self._run(job)
+
+        self.job_queue.run_once(run, max(delay, 0), name=job.name)
+
+    async def _run(self, job: ScheduledJob):
+        # Schedule the next run first, so a failing run does not stop the job
+        self._schedule(job)
+        if job.running:
+            job.stats.skipped += 1
+            logger.debug(f"Skipping job {job.name}, previous run still in progress")
+            return
+
+        job.running = True
+        started = time.monotonic()
+        try:
+            await job.callback()
+        except Exception as e:
+            job.stats.failures += 1
+            logger.warning(f"Job {job.name} failed: {e!r}")
+        finally:
+            job.running = False
+            job.stats.runs += 1
+            job.stats.last_run = datetime.now().isoformat(timespec="seconds")
+            job.stats.last_duration = round(time.monotonic() - started, 3)
@@ -1,13 +1,25 @@
-from dataclasses import dataclass
+import time
+import httpx
+import asyncio
+
+from dataclasses import dataclass, asdict
 from loguru import logger
 from enum import Enum
 from typing import List, Tuple, Optional, Any
-import requests
+from .client import ArrClient, ClientConfig
+from .cache import ResponseCache, LookupCache, get_cache_key
+from .flight import SingleFlight
+from .breaker import ServiceUnavailable, get_breaker
+from .library import LibraryMirror
+from .stream import iter_json_array, pick
 from ..tg_handler import TelegramHandler
 from ..session_database import SessionDatabase
 
 
 def find_first(elems, check, fallback=0):
+    # Without any elements (e.g. metadata not loaded), there is nothing to fall back to
+    if not elems:
+        return {}
     try:
         result = next(e for e in elems if check(e))
     except:
@@ -18,6 +30,15 @@ def find_first(elems, check, fallback=0):
         return result
 
 
+def get_poster_url(item) -> Optional[str]:
+    if item.get("remotePoster"):
+        return item.get("remotePoster")
+    images = item.get("images") or []
+    posters = [i for i in images if i.get("coverType") == "poster"]
+    image = (posters or images or [{}])[0]
+    return image.get("remoteUrl")
+
+
 class Action(Enum):
     GET = "get"
     POST = "post"
@@ -38,6 +59,7 @@ class ArrVariant(Enum):
 
 class ArrService(TelegramHandler):
     name: str
+    api_host: str
     api_url: str
     api_key: str
     api_version: str
@@ -45,130 +67,414 @@ class ArrService(TelegramHandler):
     arr_variant: ArrVariant | str = None
 
     root_folders: List[str] = []
+    quality_profiles: List[Any] = []
+    language_profiles: List[Any] = []
+    # Incremented whenever the loaded metadata changes, renders are keyed by it
+    metadata_version: int = 0
+    # Metadata lists and the resources they are loaded from
+    metadata_resources = {
+        "root_folders": "rootfolder",
+        "quality_profiles": "qualityprofile",
+    }
+    client: ArrClient
+    cache: ResponseCache
+    lookup_cache: LookupCache
+    flights: SingleFlight
+    library: LibraryMirror
     session_db: SessionDatabase = SessionDatabase()
 
-    def _post(self, endpoint, params={}):
-        return requests.post(
-            f"{self.api_url}/{endpoint}", params={"apikey": self.api_key}, json=params
+    # Cache ttl (in seconds) per api resource, resources not listed are not cached
+    cache_ttls = {
+        "rootfolder": 3600,
+        "qualityprofile": 3600,
+        "languageprofile": 3600,
+        "tag": 3600,
+        "queue": 5,
+    }
+    # Mutations of a resource also invalidate the listed resources
+    cache_related = {
+        "command": ["queue"],
+        "movie": ["queue"],
+        "series": ["queue"],
+    }
+    # Shared lookup results, patched once an item is added or removed
+    lookup_cache_size = 256
+    lookup_cache_ttl = 600
+    lookup_id_key = None
+    # Seconds between incremental and full syncs of the local library mirror
+    library_sync_interval = 60
+    library_full_sync_interval = 3600
+    webhook_library_sync_interval = 900
+    # Max concurrent POSTs when adding multiple items at once
+    bulk_add_concurrency = 4
+    # Seconds between metadata refreshes and cache cleanups
+    metadata_refresh_interval = 900
+    cache_cleanup_interval = 300
+    # Seconds between (and max seconds between) retries of a degraded service
+    load_retry_interval = 15
+    load_retry_max_interval = 300
+    # Fields kept for library items, everything else is dropped while streaming
+    library_fields: Optional[List[str]] = None
+
+    def __init__(
+        self,
+        commands: List[str] = [],
+        api_host: str = "",
+        api_key: str = "",
+        http_config: ClientConfig = ClientConfig(),
+    ):
+        self.name = f"{type(self).__name__}:{commands[0]}" if commands else ""
+        self.commands = commands
+        self.api_host = api_host
+        self.api_url = f"{api_host.rstrip('/')}/api/v3"
+        self.api_key = api_key
+        self.available = False
+        self.client = ArrClient(
+            http_config,
+            breaker=get_breaker(
+                api_host, http_config.failure_threshold, http_config.reset_timeout
+            ),
+        )
+        self.cache = ResponseCache(self.cache_ttls, related=self.cache_related)
+        self.lookup_cache = LookupCache(self.lookup_cache_size, self.lookup_cache_ttl)
+        self.flights = SingleFlight()
+        self.library = LibraryMirror(self, self.library_full_sync_interval)
+        self.jobs = []
+
+    async def _post(self, endpoint, params={}, timeout=None):
+        return await self.client.request(
+            "POST",
+            f"{self.api_url}/{endpoint}",
+            params={"apikey": self.api_key},
+            json=params,
+            timeout=timeout,
         )
 
-    def _put(self, endpoint, params={}):
-        return requests.put(
-            f"{self.api_url}/{endpoint}", params={"apikey": self.api_key}, json=params
+    async def _put(self, endpoint, params={}, timeout=None):
+        return await self.client.request(
+            "PUT",
+            f"{self.api_url}/{endpoint}",
+            params={"apikey": self.api_key},
+            json=params,
+            timeout=timeout,
         )
 
-    def _get(self, endpoint, params={}):
-        return requests.get(
-            f"{self.api_url}/{endpoint}", params={"apikey": self.api_key, **params}
+    async def _get(self, endpoint, params={}, timeout=None):
+        # GETs are idempotent and can safely be retried
+        return await self.client.request(
+            "GET",
+            f"{self.api_url}/{endpoint}",
+            params={"apikey": self.api_key, **params},
+            retry=True,
+            timeout=timeout,
         )
 
-    def _delete(self, endpoint, params={}):
-        return requests.delete(
-            f"{self.api_url}/{endpoint}", params={"apikey": self.api_key, **params}
+    async def _delete(self, endpoint, params={}, timeout=None):
+        return await self.client.request(
+            "DELETE",
+            f"{self.api_url}/{endpoint}",
+            params={"apikey": self.api_key, **params},
+            timeout=timeout,
         )
 
-    def request(self, endpoint: str, *, action=Action.GET, params={}, fallback=None):
-        r = None
+    async def _request(self, endpoint, action, params, timeout=None):
         if action == Action.GET:
-            r = self._get(endpoint, params)
+            return await self._get(endpoint, params, timeout)
         elif action == Action.POST:
-            r = self._post(endpoint, params)
+            return await self._post(endpoint, params, timeout)
         elif action == Action.PUT:
-            r = self._put(endpoint, params)
+            return await self._put(endpoint, params, timeout)
         elif action == Action.DELETE:
-            r = self._delete(endpoint, params)
+            return await self._delete(endpoint, params, timeout)
 
-        if not r:
+    async def request(
+        self,
+        endpoint: str,
+        *,
+        action=Action.GET,
+        params={},
+        fallback=None,
+        timeout: Optional[float] = None,
+        refresh=False,
+    ):
+        # A refresh skips the cached response, but still serves it if the fetch fails
+        cached = action == Action.GET and self.cache.is_cached(endpoint)
+        cache_key = get_cache_key(endpoint, params)
+        if cached and not refresh:
+            result = self.cache.get(cache_key)
+            if result is not None:
+                return result
+
+        try:
+            if action == Action.GET:
+                # Identical GETs already in flight share a single upstream call
+                r = await self.flights.do(
+                    (self.api_url, cache_key),
+                    lambda: self._request(endpoint, action, params, timeout),
+                )
+            else:
+                r = await self._request(endpoint, action, params, timeout)
+        except (httpx.TransportError, ServiceUnavailable) as e:
+            stale = self.cache.get(cache_key, allow_stale=True) if cached else None
+            if stale is None:
+                if isinstance(e, ServiceUnavailable):
+                    raise
+                logger.error(f"Could not reach {self.api_host}: {e!r}")
+                raise ServiceUnavailable(self.api_host) from e
+            logger.warning(f"Serving stale {endpoint} after error: {e!r}")
+            return stale
+        finally:
+            if action != Action.GET:
+                self.cache.invalidate(endpoint)
+
+        if not r or r.is_error:
+            stale = self.cache.get(cache_key, allow_stale=True) if cached else None
+            if stale is not None and r is not None and r.is_server_error:
+                logger.warning(f"Serving stale {endpoint} after {r.status_code}")
+                return stale
             return fallback
 
-        if action != Action.DELETE:
-            return r.json()
-        return r
+        if action == Action.DELETE or not r.content:
+            return r
 
-    def detect_api(self, api_host):
-        status = None
-        # Detect version and api_url
+        result = r.json()
+        if cached:
+            self.cache.set(cache_key, result)
+        return result
+
+    async def stream(self, endpoint: str, *, params={}, fields=None):
+        # Lazily yields the elements of a json array response
+        chunks = self.client.stream(
+            "GET",
+            f"{self.api_url}/{endpoint}",
+            params={"apikey": self.api_key, **params},
+        )
         try:
-            self.api_url = f"{api_host.rstrip('/')}/api/v3"
-            status = self.request("system/status")
-            if not status:
-                self.api_url = f"{api_host.rstrip('/')}/api"
-                status = self.request("system/status")
-                assert not status, "By default only v3 ArrServices are supported"
-        finally:
-            if status is None:
-                logger.error(
-                    f"Could not reach compatible api. Is the service ({self.api_url}) down? Is your API key correct?"
+            async for item in iter_json_array(chunks):
+                yield pick(item, fields)
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            logger.error(f"Could not stream {endpoint} from {self.api_host}: {e!r}")
+            raise ServiceUnavailable(self.api_host) from e
+
+    def stream_library(self):
+        return self.stream(self.arr_variant.value, fields=self.library_fields)
+
+    def get_stats(self):
+        return {
+            "connections": self.client.stats.as_dict(),
+            "circuit_breaker": asdict(self.client.breaker.stats),
+            "cache": asdict(self.cache.stats),
+            "lookup_cache": asdict(self.lookup_cache.stats),
+            "single_flight": asdict(self.flights.stats),
+            "library": asdict(self.library.get_stats()),
+            **{
+                f"job {job.name.removeprefix(self.name + ':')}": asdict(job.stats)
+                for job in self.jobs
+            },
+        }
+
+    async def close(self):
+        await self.client.close()
+
+    def register_jobs(self, scheduler):
+        self.jobs = [
+            scheduler.register(
+                f"{self.name}:metadata",
+                self.refresh_metadata,
+                self.metadata_refresh_interval,
+            ),
+            scheduler.register(
+                f"{self.name}:cache_cleanup",
+                self.cleanup_caches,
+                self.cache_cleanup_interval,
+            ),
+        ]
+        if self.arr_variant:
+            self.jobs.append(
+                scheduler.register(
+                    f"{self.name}:library",
+                    self.library.sync,
+                    self.library_sync_interval,
+                    first=0,
                 )
-                exit(1)
-            assert (
-                status
-            ), "Could not reach compatible api. Is the service down? Is your API key correct?"
-            api_version = status.get("version", "")
-            assert api_version, "Could not find compatible api."
-            return api_version
-
-    def get_queue_item(self, id: int):
-        return self.request(
+            )
+
+    async def refresh_metadata(self):
+        # Degraded services are reloaded by _retry_load instead
+        if not self.available:
+            return
+        try:
+            await self.load_metadata(refresh=True)
+            await self.get_tags(refresh=True)
+        except ServiceUnavailable as e:
+            logger.warning(f"[{self.name}] Could not refresh metadata: {e}")
+
+    async def cleanup_caches(self):
+        self.cache.purge_expired()
+        self.lookup_cache.purge_expired()
+
+    async def list_library(self):
+        await self.ensure_available()
+        if self.library.synced:
+            return self.library.list()
+        return [item async for item in self.stream_library()]
+
+    async def load_metadata(self, refresh=False):
+        names = list(self.metadata_resources)
+        results = await asyncio.gather(
+            *[
+                self.request(self.metadata_resources[name], refresh=refresh)
+                for name in names
+            ]
+        )
+        changed = False
+        for name, result in zip(names, results):
+            # Failed or empty responses keep the previously loaded metadata
+            if not result:
+                logger.warning(f"[{self.name}] Could not load {name}, keeping the last")
+                continue
+            if result != getattr(self, name):
+                setattr(self, name, result)
+                changed = True
+        if changed:
+            self.metadata_version += 1
+
+    async def load(self):
+        started = time.monotonic()
+        self.api_version = await self.detect_api(self.api_host)
+        detected = time.monotonic()
+        logger.info(
+            f"[{self.name}] Detected api {self.api_version} in {detected - started:.2f}s"
+        )
+        await self.load_metadata()
+        logger.info(
+            f"[{self.name}] Loaded metadata in {time.monotonic() - detected:.2f}s"
+        )
+        self.available = True
+
+    async def ensure_available(self):
+        # Degraded services load on demand, instead of waiting for _retry_load
+        if self.available:
+            return
+        try:
+            await self.flights.do("load", self.load)
+        except ServiceUnavailable:
+            raise
+        except Exception as e:
+            raise ServiceUnavailable(self.api_host) from e
+        logger.info(f"[{self.name}] Service recovered")
+
+    async def _retry_load(self):
+        delay = self.load_retry_interval
+        while not self.available:
+            await asyncio.sleep(delay)
+            if self.available:
+                # Already loaded on demand
+                return
+            try:
+                await self.flights.do("load", self.load)
+                logger.info(f"[{self.name}] Service recovered")
+            except Exception as e:
+                logger.warning(f"[{self.name}] Service still unavailable: {e}")
+                delay = min(delay * 2, self.load_retry_max_interval)
+
+    async def start(self, application):
+        # Unreachable services start degraded and keep trying to load in the background
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(
+                f"[{self.name}] Could not reach compatible api ({self.api_url}): {e}. "
+                "Is the service down? Is your API key correct? Starting degraded."
+            )
+            application.create_task(self._retry_load())
+
+    async def detect_api(self, api_host):
+        # Detect version and api_url
+        api_url = f"{api_host.rstrip('/')}/api/v3"
+        self.api_url = api_url
+        status = await self.request("system/status")
+        if not status:
+            self.api_url = f"{api_host.rstrip('/')}/api"
+            legacy_status = await self.request("system/status")
+            self.api_url = api_url
+            assert not legacy_status, "By default only v3 ArrServices are supported"
+            raise ServiceUnavailable(api_host)
+        api_version = status.get("version", "")
+        assert api_version, "Could not find compatible api."
+        return api_version
+
+    async def get_queue_item(self, id: int):
+        return await self.request(
             f"queue/{id}",
             params=params,
             fallback=[],
         )
 
-    def get_queue(self, page: int = None, page_size: int = None):
+    async def get_queue(self, page: int = None, page_size: int = None):
         params = {}
         if page != None:
             params["page"] = page
         if page_size != None:
             params["page_size"] = page_size
-        return self.request(
+        return await self.request(
             "queue",
             params=params,
             fallback=[],
         )
 
-    def get_queue_details(self, movie_id: int = None, include_movie: bool = None):
+    async def get_queue_details(self, movie_id: int = None, include_movie: bool = None):
         params = {}
         if movie_id:
             params["movieId"] = movie_id
         if include_movie != None:
             params["includeMovie"] = include_movie
-        return self.request(
+        return await self.request(
             "queue",
             params=params,
             fallback=[],
         )
 
-    def get_queue_detail(self, id: int):
-        return self.request(
+    async def get_queue_detail(self, id: int):
+        return await self.request(
             f"queue/details/{id}",
             params={},
             fallback=[],
         )
 
-    def list_(self):
+    async def list_(self):
         if not self.arr_variant:
             return NotImplementedError(
                 "Unsupported Arr variant. You have to implement your own search"
             )
 
-        return self.request(f"{self.arr_variant.value}", fallback=[])
+        return await self.request(f"{self.arr_variant.value}", fallback=[])
 
-    def lookup(self, term: str = None):
+    async def lookup(self, term: str = None):
         if not self.arr_variant:
             return NotImplementedError(
                 "Unsupported Arr variant. You have to implement your own search"
             )
         if not term:
             return []
+        await self.ensure_available()
+
+        cached = self.lookup_cache.get(term)
+        if cached is not None:
+            return cached
 
-        return self.request(
+        result = await self.request(
             f"{self.arr_variant.value}/lookup",
             params={"term": term},
-            fallback=[],
+            fallback=None,
         )
+        if result is None:
+            return []
+        result = [self.library.rehydrate(item) for item in result]
+        self.lookup_cache.set(term, result)
+        return result
 
-    def add(
+    async def add(
         self,
         *,
         item=None,
@@ -186,11 +492,13 @@ class ArrService(TelegramHandler):
         if item_id:
             action = Action.PUT
             endpoint = f"{self.arr_variant.value}/{item_id}"
+            # Library items might be trimmed to library_fields, update the full item
+            item = {**await self.request(endpoint, fallback={}), **item}
         else:
             action = Action.POST
             endpoint = self.arr_variant.value
 
-        return self.request(
+        result = await self.request(
             endpoint,
             action=action,
             params={
@@ -204,39 +512,96 @@ class ArrService(TelegramHandler):
                 **options,
             },
         )
+        if result:
+            self.library.upsert(result)
+        if result and self.lookup_id_key and item.get(self.lookup_id_key):
+            self.lookup_cache.patch(
+                self.lookup_id_key, item.get(self.lookup_id_key), result
+            )
+        return result
+
+    async def add_many(self, items, **kwargs):
+        # Adds run concurrently, but limited to not overload the arr
+        semaphore = asyncio.Semaphore(self.bulk_add_concurrency)
+
+        async def add(item):
+            async with semaphore:
+                return await self.add(item=item, **kwargs)
 
-    def remove(self, *, id=None):
+        return await asyncio.gather(*[add(item) for item in items])
+
+    async def edit(
+        self,
+        ids: List[int],
+        *,
+        monitored: Optional[bool] = None,
+        quality_profile_id: Optional[int] = None,
+        tags: Optional[List[int]] = None,
+        apply_tags="add",
+    ):
+        params = {f"{self.arr_variant.value}Ids": ids}
+        if monitored is not None:
+            params["monitored"] = monitored
+        if quality_profile_id is not None:
+            params["qualityProfileId"] = quality_profile_id
+        if tags is not None:
+            params["tags"] = tags
+            params["applyTags"] = apply_tags
+
+        result = await self.request(
+            f"{self.arr_variant.value}/editor", action=Action.PUT, params=params
+        )
+        if isinstance(result, list):
+            for item in result:
+                self.library.upsert(pick(item, self.library_fields))
+                self.lookup_cache.patch("id", item.get("id"), item)
+        return result
+
+    async def remove(self, *, id=None):
         assert id, "Missing required arg! You need to provide a id!"
-        return self.request(
+        result = await self.request(
             f"{self.arr_variant.value}/{id}",
             action=Action.DELETE,
         )
+        if result:
+            self.library.remove(id)
+            self.lookup_cache.patch("id", id, None)
+        return result
 
-    def get_root_folders(self) -> List[str]:
-        return self.request("rootfolder", fallback=[])
+    async def get_root_folders(self) -> List[str]:
+        return await self.request("rootfolder", fallback=[])
 
-    def get_root_folder(self, id: str) -> List[str]:
-        return self.request(f"rootfolder/{id}", fallback={})
+    async def get_root_folder(self, id: str) -> List[str]:
+        loaded = [r for r in self.root_folders if str(r.get("id")) == str(id)]
+        if loaded:
+            return loaded[0]
+        return await self.request(f"rootfolder/{id}", fallback={})
 
-    def get_tags(self):
-        return self.request("tag", fallback=[])
+    async def get_tags(self, refresh=False):
+        return await self.request("tag", fallback=[], refresh=refresh)
 
-    def get_tag(self, id: str):
-        return self.request(f"tag/{id}", fallback={})
+    async def get_tag(self, id: str):
+        return await self.request(f"tag/{id}", fallback={})
 
-    def add_tag(self, label):
-        return self.request(
+    async def add_tag(self, label):
+        return await self.request(
             "tag", action=Action.POST, params={"label": label}, fallback={}
         )
 
-    def get_quality_profiles(self):
-        return self.request("qualityprofile", fallback=[])
+    async def get_quality_profiles(self):
+        return await self.request("qualityprofile", fallback=[])
 
-    def get_quality_profile(self, id):
-        return self.request(f"qualityprofile/{id}", fallback={})
+    async def get_quality_profile(self, id):
+        loaded = [q for q in self.quality_profiles if str(q.get("id")) == str(id)]
+        if loaded:
+            return loaded[0]
+        return await self.request(f"qualityprofile/{id}", fallback={})
 
-    def get_language_profiles(self):
-        return self.request("languageprofile", fallback=[])
+    async def get_language_profiles(self):
+        return await self.request("languageprofile", fallback=[])
 
-    def get_language_profile(self, id):
-        return self.request(f"languageprofile/{id}", fallback={})
+    async def get_language_profile(self, id):
+        loaded = [p for p in self.language_profiles if str(p.get("id")) == str(id)]
+        if loaded:
+            return loaded[0]
+        return await self.request(f"languageprofile/{id}", fallback={})
@@ -0,0 +1,104 @@
+import time
+
+from enum import Enum
+from dataclasses import dataclass
+from typing import Dict
+from loguru import logger
+
+from ..tg_handler.message import Response, ResponseError
+
+
+class ServiceUnavailable(ResponseError):
+    def __init__(self, api_host: str):
+        self.api_host = api_host
+        super().__init__(
+            Response(
+                caption="Service is currently unavailable. Please try again later."
+            )
+        )
+
+    def __str__(self):
+        return f"{self.api_host} is unavailable"
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass
+class BreakerStats:
+    state: str = BreakerState.CLOSED.value
+    failures: int = 0
+    rejected: int = 0
+    opened: int = 0
+
+
+class CircuitBreaker:
+    """
+    Fails fast while an api host is down.
+    Opens after `failure_threshold` consecutive failures and lets a single probe
+    request through once `reset_timeout` seconds passed.
+    """
+
+    def __init__(self, api_host: str, failure_threshold=5, reset_timeout=30.0):
+        self.api_host = api_host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.stats = BreakerStats()
+
+    def _set_state(self, state: BreakerState):
+        if state != self.state:
+            logger.info(f"Circuit breaker for {self.api_host} is now {state.value}")
+        self.state = state
+        self.stats.state = state.value
+
+    def check(self):
+        if self.state == BreakerState.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.stats.rejected += 1
+                raise ServiceUnavailable(self.api_host)
+            self._set_state(BreakerState.HALF_OPEN)
+        if self.state == BreakerState.HALF_OPEN:
+            if self.probing:
+                self.stats.rejected += 1
+                raise ServiceUnavailable(self.api_host)
+            self.probing = True
+
+    def release(self):
+        # An unfinished probe, let the next call probe again
+        self.probing = False
+
+    def success(self):
+        self.probing = False
+        self.failures = 0
+        self.stats.failures = 0
+        self._set_state(BreakerState.CLOSED)
+
+    def failure(self):
+        self.probing = False
+        self.failures += 1
+        self.stats.failures = self.failures
+        if (
+            self.state == BreakerState.HALF_OPEN
+            or self.failures >= self.failure_threshold
+        ):
+            self.opened_at = time.monotonic()
+            self.stats.opened += 1
+            self._set_state(BreakerState.OPEN)
+
+
+BREAKERS: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(api_host: str, failure_threshold=5, reset_timeout=30.0):
+    # Services using the same api host share a breaker
+    key = api_host.rstrip("/")
+    if key not in BREAKERS:
+        BREAKERS[key] = CircuitBreaker(key, failure_threshold, reset_timeout)
+    return BREAKERS[key]
@@ -0,0 +1,167 @@
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+def get_resource(endpoint: str):
+    return endpoint.strip("/").split("/")[0]
+
+
+def get_cache_key(endpoint: str, params: Dict[str, Any] = {}):
+    return (endpoint.strip("/"), tuple(sorted((k, str(v)) for k, v in params.items())))
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    resource: str
+    expires_at: float
+    stale_until: float
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stale_hits: int = 0
+    invalidations: int = 0
+
+
+class ResponseCache:
+    """
+    Caches GET responses using a ttl per resource (first segment of the endpoint).
+    Resources without a ttl are never cached.
+    Expired entries are kept for `stale_ttl` seconds to be served if the api is unreachable.
+    """
+
+    def __init__(
+        self,
+        ttls: Dict[str, float],
+        stale_ttl: float = 3600,
+        related: Dict[str, list] = {},
+    ):
+        self.ttls = ttls
+        self.stale_ttl = stale_ttl
+        self.related = related
+        self.entries: Dict[Any, CacheEntry] = {}
+        self.stats = CacheStats()
+
+    def is_cached(self, endpoint: str):
+        return self.ttls.get(get_resource(endpoint), 0) > 0
+
+    def get(self, key, *, allow_stale=False) -> Optional[Any]:
+        entry = self.entries.get(key)
+        now = time.monotonic()
+        if entry and now < entry.expires_at:
+            self.stats.hits += 1
+            return entry.value
+        if entry and allow_stale and now < entry.stale_until:
+            self.stats.stale_hits += 1
+            return entry.value
+        if entry and now >= entry.stale_until:
+            del self.entries[key]
+        if not allow_stale:
+            self.stats.misses += 1
+        return None
+
+    def set(self, key, value):
+        resource = get_resource(key[0])
+        ttl = self.ttls.get(resource, 0)
+        if ttl <= 0 or value is None:
+            return
+        now = time.monotonic()
+        self.entries[key] = CacheEntry(
+            value=value,
+            resource=resource,
+            expires_at=now + ttl,
+            stale_until=now + ttl + self.stale_ttl,
+        )
+
+    def purge_expired(self):
+        now = time.monotonic()
+        for key in [k for k, e in self.entries.items() if now >= e.stale_until]:
+            del self.entries[key]
+
+    def invalidate(self, endpoint: str):
+        resource = get_resource(endpoint)
+        resources = {resource, *self.related.get(resource, [])}
+        keys = [k for k, e in self.entries.items() if e.resource in resources]
+        for k in keys:
+            del self.entries[k]
+        self.stats.invalidations += len(keys)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def normalize_term(term: str):
+    return " ".join(term.lower().split())
+
+
+@dataclass
+class LookupCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+
+class LookupCache:
+    """
+    Bounded LRU cache for lookup results, keyed by the normalized search term.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.stats = LookupCacheStats()
+
+    def get(self, term: str) -> Optional[List[Any]]:
+        key = normalize_term(term)
+        entry = self.entries.get(key)
+        if entry and time.monotonic() < entry.expires_at:
+            self.entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry.value
+        if entry:
+            del self.entries[key]
+        self.stats.misses += 1
+        self.stats.size = len(self.entries)
+        return None
+
+    def set(self, term: str, items: List[Any]):
+        key = normalize_term(term)
+        expires_at = time.monotonic() + self.ttl
+        self.entries[key] = CacheEntry(
+            value=items, resource="lookup", expires_at=expires_at, stale_until=expires_at
+        )
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats.evictions += 1
+        self.stats.size = len(self.entries)
+
+    def purge_expired(self):
+        now = time.monotonic()
+        for key in [k for k, e in self.entries.items() if now >= e.expires_at]:
+            del self.entries[key]
+        self.stats.size = len(self.entries)
+
+    def patch(self, field: str, value: Any, item: Optional[Dict[str, Any]]):
+        # Replace every cached result matching field == value, or drop its library id
+        for entry in self.entries.values():
+            entry.value = [
+                (
+                    (item or {k: v for k, v in e.items() if k != "id"})
+                    if e.get(field) == value
+                    else e
+                )
+                for e in entry.value
+            ]
+
+    def clear(self):
+        self.entries.clear()
+        self.stats.size = 0
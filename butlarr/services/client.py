@@ -0,0 +1,167 @@
+import httpx
+import random
+import asyncio
+
+from loguru import logger
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from .breaker import CircuitBreaker
+
+
+@dataclass(frozen=True)
+class ClientConfig:
+    max_connections: int = 10
+    max_keepalive_connections: int = 5
+    keepalive_expiry: float = 30.0
+    timeout: float = 10.0
+    connect_timeout: float = 5.0
+    retries: int = 2
+    retry_backoff: float = 0.25
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+
+    @staticmethod
+    def from_config(*configs):
+        merged = {}
+        for c in configs:
+            merged.update(c or {})
+        fields = ClientConfig.__dataclass_fields__
+        return ClientConfig(**{k: v for k, v in merged.items() if k in fields})
+
+
+RETRY_STATUS_CODES = [502, 503, 504]
+
+
+@dataclass
+class ConnectionStats:
+    requests: int = 0
+    connections_opened: int = 0
+    retries: int = 0
+
+    @property
+    def connections_reused(self):
+        return max(self.requests - self.connections_opened, 0)
+
+    def as_dict(self):
+        return {**asdict(self), "connections_reused": self.connections_reused}
+
+
+class ArrClient:
+    """
+    Pooled keep-alive http client, owned by a single service.
+    Counts opened connections, so that connection reuse can be verified.
+    Requests are guarded by the circuit breaker of the api host.
+    """
+
+    def __init__(
+        self,
+        config: ClientConfig = ClientConfig(),
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.config = config
+        self.breaker = breaker
+        self.stats = ConnectionStats()
+        self._client = None
+
+    def _create_client(self):
+        limits = httpx.Limits(
+            max_connections=self.config.max_connections,
+            max_keepalive_connections=self.config.max_keepalive_connections,
+            keepalive_expiry=self.config.keepalive_expiry,
+        )
+        timeout = httpx.Timeout(
+            self.config.timeout, connect=self.config.connect_timeout
+        )
+        return httpx.AsyncClient(limits=limits, timeout=timeout)
+
+    async def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.connections_opened += 1
+
+    async def _send(self, method, url, **kwargs):
+        if not self._client:
+            self._client = self._create_client()
+        self.stats.requests += 1
+        return await self._client.request(
+            method, url, extensions={"trace": self._trace}, **kwargs
+        )
+
+    def _get_backoff(self, attempt):
+        delay = self.config.retry_backoff * (2**attempt)
+        return delay + random.uniform(0, delay)
+
+    async def request(self, method, url, *, retry=False, timeout=None, **kwargs):
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        if self.breaker:
+            self.breaker.check()
+
+        attempts = self.config.retries + 1 if retry else 1
+        # None if cancelled, which is neither a success nor a failure of the host
+        failed = None
+        try:
+            for attempt in range(attempts):
+                error, r = None, None
+                try:
+                    r = await self._send(method, url, **kwargs)
+                    if r.status_code not in RETRY_STATUS_CODES:
+                        break
+                except httpx.TransportError as e:
+                    error = e
+                if attempt < attempts - 1:
+                    self.stats.retries += 1
+                    backoff = self._get_backoff(attempt)
+                    logger.debug(f"Retrying {method} {url} in {backoff:.2f}s")
+                    await asyncio.sleep(backoff)
+            failed = bool(error) or r.status_code in RETRY_STATUS_CODES
+        except Exception:
+            failed = True
+            raise
+        finally:
+            if self.breaker and failed is None:
+                self.breaker.release()
+            elif self.breaker and failed:
+                self.breaker.failure()
+            elif self.breaker:
+                self.breaker.success()
+        if error:
+            raise error
+        return r
+
+    async def stream(self, method, url, **kwargs):
+        # Yields the raw response body in chunks, without loading it at once
+        if not self._client:
+            self._client = self._create_client()
+        if self.breaker:
+            self.breaker.check()
+        self.stats.requests += 1
+
+        # None if cancelled or closed early, as in request
+        failed = None
+        try:
+            async with self._client.stream(
+                method, url, extensions={"trace": self._trace}, **kwargs
+            ) as r:
+                r.raise_for_status()
+                async for chunk in r.aiter_bytes():
+                    yield chunk
+            failed = False
+        except httpx.HTTPStatusError as e:
+            failed = e.response.is_server_error
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            if self.breaker and failed is None:
+                self.breaker.release()
+            elif self.breaker and failed:
+                self.breaker.failure()
+            elif self.breaker:
+                self.breaker.success()
+
+    async def close(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
@@ -1,15 +1,28 @@
-import math
-from typing import Dict, Any
-from dataclasses import dataclass
+from collections import Counter
+from typing import Dict, Any, Optional
+from dataclasses import dataclass, replace, asdict
+from loguru import logger
+from telegram import InlineQueryResultArticle, InputTextMessageContent
+from telegram.error import Forbidden, TelegramError
 
-from . import ArrService
-from ..config.queue import WIDTH, PAGE_SIZE
+from . import ArrService, get_poster_url
+from .watch import QueuePoller
+from .stream import pick
+from .breaker import ServiceUnavailable
+from .posters import get_tmdb_url
+from .queue_render import QueueRenderer
+from ..config.queue import PAGE_SIZE
 
 from ..tg_handler import command, callback, handler, escape_markdownv2_chars
 from ..tg_handler.keyboard import keyboard
 from ..tg_handler.message import Response
-from ..tg_handler.message import Response, repaint, clear
+from ..tg_handler.message import Response, repaint, clear, RENDERED, get_render_hash
 from ..tg_handler.auth import authorized
+from ..tg_handler.send_queue import SEND_QUEUE, Priority
+from ..tg_handler.posters import POSTERS
+from ..tg_handler.callback_data import CALLBACK_CODEC
+from ..tg_handler.inline import INLINE_MAX_RESULTS
+from ..tg_handler.render_cache import RENDER_CACHE
 from ..tg_handler.session_state import sessionState, default_session_state_key_fn
 from ..tg_handler.keyboard import Button, keyboard
 
@@ -19,10 +32,265 @@ class QueueState:
     items: Dict[str, Any]
     page: int
     page_size: int
+    watching: bool = False
+
+
+BULK_MENUS = ["bulk", "bulkquality", "bulktags"]
+
+WEBHOOK_EVENTS = {
+    "Grab": "📥 Grabbed",
+    "Download": "✅ Downloaded",
+    "Upgrade": "⬆️ Upgraded",
+    "MovieDelete": "🗑 Deleted",
+    "SeriesDelete": "🗑 Deleted",
+    "MovieFileDelete": "🗑 Deleted file of",
+    "EpisodeFileDelete": "🗑 Deleted file of",
+}
 
 
 @handler
 class ExtArrService(ArrService):
+    queue_poller: QueuePoller
+    # Fields of an item read by create_caption
+    caption_keys = ["title", "year", "runtime", "status", "overview"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queue_poller = QueuePoller(self)
+        self.queue_renderer = QueueRenderer()
+        self.webhook_events = Counter()
+
+    def get_stats(self):
+        return {
+            **super().get_stats(),
+            "queue_watch": asdict(self.queue_poller.stats),
+            "queue_render": asdict(self.queue_renderer.stats),
+            "webhooks": dict(self.webhook_events),
+            "rendering": {
+                "skipped_edits": RENDERED.skipped,
+                **asdict(RENDER_CACHE.stats),
+            },
+            "send_queue": asdict(SEND_QUEUE.get_stats()),
+            "posters": asdict(POSTERS.stats),
+            "callback_data": asdict(CALLBACK_CODEC.stats),
+            **(
+                {"poster_fetcher": asdict(POSTERS.fetcher.stats)}
+                if POSTERS.fetcher
+                else {}
+            ),
+        }
+
+    def prefetch_posters(self, state):
+        # Fetch the posters of the neighbouring items, to navigate to them quickly
+        neighbours = [state.index + 1, state.index - 1, state.index + 2]
+        POSTERS.prefetch(
+            [
+                get_poster_url(state.items[i])
+                for i in neighbours
+                if 0 <= i < len(state.items)
+            ]
+        )
+
+    def get_inline_result(self, item):
+        key = self.lookup_id_key
+        title = item.get("title", "")
+        if item.get("year"):
+            title += f" ({item.get('year')})"
+        description = item.get("overview") or ""
+        if item.get("id"):
+            description = f"📚 In library - {description}"
+        # Picking a result opens the normal card, using the arrs id lookup syntax
+        command = f"/{self.commands[0]} {key.removesuffix('Id')}:{item.get(key)}"
+        return InlineQueryResultArticle(
+            id=f"{self.commands[0]}:{item.get(key)}",
+            title=title,
+            description=description[:200],
+            thumbnail_url=get_tmdb_url(get_poster_url(item), 92),
+            input_message_content=InputTextMessageContent(command),
+        )
+
+    async def inline_search(self, term):
+        try:
+            items = await self.lookup(term)
+        except ServiceUnavailable:
+            return []
+        return [
+            self.get_inline_result(item)
+            for item in items[:INLINE_MAX_RESULTS]
+            if item.get(self.lookup_id_key)
+        ]
+
+    def get_selection_row(self, state):
+        selected = state.index in state.selected
+        return [
+            Button(
+                "☑ Selected" if selected else "☐ Select",
+                self.get_clbk("select", state.index),
+            ),
+            (
+                Button(f"📋 Bulk ({len(state.selected)})", self.get_clbk("bulk"))
+                if state.selected
+                else None
+            ),
+        ]
+
+    def get_selected_metadata(self, state):
+        # Shown by the add menu
+        return (state.quality_profile.get("name"), state.root_folder.get("path"))
+
+    def get_keyboard_key(self, state, allow_edit=False):
+        # Menus depending on more than the item and the selected metadata are not cached
+        if state.menu in ["tags", "seasons", *BULK_MENUS]:
+            return None
+        item = state.items[state.index]
+        return (
+            self,
+            self.metadata_version,
+            state.menu,
+            bool(allow_edit),
+            state.index,
+            len(state.items),
+            state.index in state.selected,
+            len(state.selected),
+            *[item.get(k) for k in ["id", "tmdbId", "imdbId", "monitored", "hasFile"]],
+            *(self.get_selected_metadata(state) if state.menu == "add" else ()),
+        )
+
+    def create_metadata_menu(self, menu):
+        (title, profiles, label, clbk) = {
+            "path": ("Root Folder", self.root_folders, "path", "selectpath"),
+            "quality": (
+                "Quality Profile",
+                self.quality_profiles,
+                "name",
+                "selectquality",
+            ),
+            "language": (
+                "Language Profile",
+                self.language_profiles,
+                "name",
+                "selectlanguage",
+            ),
+        }[menu]
+        row_navigation = [Button(f"=== Selecting {title} ===")]
+        rows_menu = [
+            [Button(p.get(label, "-"), self.get_clbk(clbk, p.get("id")))]
+            for p in profiles
+        ]
+        return (row_navigation, rows_menu)
+
+    def get_metadata_menu(self, menu):
+        # The same for every user, so only built once per metadata version
+        return RENDER_CACHE.render(
+            (self, self.metadata_version, menu),
+            lambda: self.create_metadata_menu(menu),
+        )
+
+    def create_caption(self, item):
+        caption = f"{item['title']} "
+        if item["year"] and str(item["year"]) not in item["title"]:
+            caption += f"({item['year']}) "
+
+        if item["runtime"]:
+            caption += f"{item['runtime']}min "
+
+        caption += f"- {item['status'].title()}\n\n{item.get('overview', '')}"
+        return caption[0:1024]
+
+    def get_caption(self, item):
+        # Keyed by every field the caption is created from
+        key = ("caption", *(item.get(k) for k in self.caption_keys))
+        return RENDER_CACHE.render(key, lambda: self.create_caption(item))
+
+    async def get_bulk_keyboard(self, state):
+        selected = [state.items[i] for i in state.selected]
+        in_library = [i for i in selected if i.get("id")]
+        new = [i for i in selected if not i.get("id")]
+
+        if state.menu == "bulkquality":
+            row_navigation = [Button("=== Selecting Quality Profile ===")]
+            rows_menu = [
+                [
+                    Button(
+                        p.get("name", "-"),
+                        self.get_clbk("bulkedit", "quality", p.get("id")),
+                    )
+                ]
+                for p in self.quality_profiles
+            ]
+        elif state.menu == "bulktags":
+            row_navigation = [Button("=== Adding Tag ===")]
+            rows_menu = [
+                [
+                    Button(
+                        t.get("label", "-"),
+                        self.get_clbk("bulkedit", "tag", t.get("id")),
+                    )
+                ]
+                for t in await self.get_tags()
+            ]
+        else:
+            row_navigation = [Button(f"=== Editing {len(selected)} Items ===")]
+            rows_menu = []
+            if in_library:
+                rows_menu += [
+                    [
+                        Button("📺 Monitor", self.get_clbk("bulkedit", "monitor")),
+                        Button("Unmonitor", self.get_clbk("bulkedit", "unmonitor")),
+                    ],
+                    [Button("Change Quality", self.get_clbk("bulkquality"))],
+                    [Button("Add Tag", self.get_clbk("bulktags"))],
+                ]
+            if new:
+                rows_menu.append(
+                    [Button(f"➕ Add {len(new)} new", self.get_clbk("bulkadd"))]
+                )
+            rows_menu.append([Button("Clear Selection", self.get_clbk("bulkclear"))])
+
+        return (row_navigation, rows_menu)
+
+    def get_bulk_state(self, state, args):
+        if args[0] == "select":
+            idx = int(args[1])
+            if idx in state.selected:
+                selected = tuple(i for i in state.selected if i != idx)
+            else:
+                selected = (*state.selected, idx)
+            return replace(state, selected=selected)
+        elif args[0] == "bulkclear":
+            return replace(state, selected=(), menu=None)
+        return replace(state, menu=args[0])
+
+    def get_bulk_add_args(self, state):
+        # Items are added with the metadata selected in the add menu
+        return {
+            "quality_profile_id": state.quality_profile.get("id"),
+            "root_folder_path": state.root_folder.get("path"),
+        }
+
+    async def bulk_update(self, state, args):
+        selected = [state.items[i] for i in state.selected]
+        if args[0] == "bulkadd":
+            new = [i for i in selected if not i.get("id")]
+            results = await self.add_many(new, **self.get_bulk_add_args(state))
+            return f"Added {len([r for r in results if r])} of {len(new)} items!"
+
+        ids = [i.get("id") for i in selected if i.get("id")]
+        if args[1] == "monitor":
+            result = await self.edit(ids, monitored=True)
+        elif args[1] == "unmonitor":
+            result = await self.edit(ids, monitored=False)
+        elif args[1] == "quality":
+            result = await self.edit(ids, quality_profile_id=int(args[2]))
+        elif args[1] == "tag":
+            result = await self.edit(ids, tags=[int(args[2])])
+        else:
+            logger.error(f"Unknown bulk edit {args[1:]} for {self.name}")
+            return "Seems like something went wrong..."
+        if not result:
+            return "Seems like something went wrong..."
+        return f"Updated {len(ids)} items!"
+
     @keyboard
     def create_queue_keyboard(self, state: QueueState):
         total_pages = int(state.items["totalRecords"]) // state.page_size
@@ -39,24 +307,18 @@ class ExtArrService(ArrService):
                     else Button()
                 ),
             ],
+            (
+                [Button("⏹ Stop watching", self.get_clbk("unwatch"))]
+                if state.watching
+                else None
+            ),
         ]
 
     def create_queue_message(self, state: QueueState, full_redraw=False):
-        lines = ["*Queue*", ""]
+        lines = ["*Queue* \\(live\\)" if state.watching else "*Queue*", ""]
         offset = state.page * state.page_size + 1
         for idx, item in enumerate(state.items["records"]):
-            percent = 1.0 - (float(item.get("sizeleft", 0)) / (item.get("size") or 1))
-            progress = math.floor(percent * WIDTH)
-            remaining = math.ceil((1.0 - percent) * WIDTH)
-
-            title = escape_markdownv2_chars(item.get("title", "")[0 : 2 * WIDTH])
-            title_ln = rf"{offset + idx}\. *{title}*"
-            progress_ln = (
-                rf">`[{progress * '='}|{(remaining*' ')}]` {round(percent*100)}%"
-            )
-            status_ln = rf">Status: _{escape_markdownv2_chars(item.get('status', 'N/A'))}_ \(_{escape_markdownv2_chars(item.get('trackedDownloadState', '-'))}_\)   Time left: _{escape_markdownv2_chars(item.get('timeleft', 'N/A'))}_"
-
-            lines += [title_ln, progress_ln, status_ln]
+            lines += self.queue_renderer.render(item, offset + idx)
 
         if not len(state.items["records"]):
             n = PAGE_SIZE // 4
@@ -77,8 +339,32 @@ class ExtArrService(ArrService):
             parse_mode="MarkdownV2",
         )
 
+    def render_queue_watch(self, page, poller):
+        state = QueueState(
+            items=poller.get_page(page, PAGE_SIZE),
+            page=page,
+            page_size=PAGE_SIZE,
+            watching=True,
+        )
+        return self.create_queue_message(state)
+
     async def cmd_queue(self, update, context, args):
-        items = self.get_queue(page=0, page_size=PAGE_SIZE)
+        if len(args) > 1 and args[1] == "watch":
+            poller = self.queue_poller
+            await poller.poll()
+            response = self.render_queue_watch(0, poller)
+            message = await update.message.reply_text(
+                response.caption,
+                reply_markup=response.reply_markup,
+                parse_mode=response.parse_mode,
+            )
+            RENDERED.set(
+                message.chat_id, message.message_id, get_render_hash(response), False
+            )
+            poller.watch(context.application, message.chat_id, message.message_id)
+            return
+
+        items = await self.get_queue(page=0, page_size=PAGE_SIZE)
 
         state = QueueState(
             items=items,
@@ -89,7 +375,12 @@ class ExtArrService(ArrService):
         return self.create_queue_message(state)
 
     async def clbk_queue(self, update, context, args):
-        items = self.get_queue(page=int(args[1]), page_size=PAGE_SIZE)
+        message = update.callback_query.message
+        poller = self.queue_poller
+        if poller.touch(message.chat_id, message.message_id, int(args[1])):
+            return self.render_queue_watch(int(args[1]), poller)
+
+        items = await self.get_queue(page=int(args[1]), page_size=PAGE_SIZE)
 
         state = QueueState(
             items=items,
@@ -99,6 +390,111 @@ class ExtArrService(ArrService):
 
         return self.create_queue_message(state)
 
+    async def clbk_unwatch(self, update, context, args):
+        message = update.callback_query.message
+        poller = self.queue_poller
+        watch = poller.get(message.chat_id, message.message_id)
+        poller.unwatch(message.chat_id, message.message_id)
+        page = watch.page if watch else 0
+        state = QueueState(
+            items=poller.get_page(page, PAGE_SIZE),
+            page=page,
+            page_size=PAGE_SIZE,
+        )
+        return self.create_queue_message(state)
+
+    def get_webhook_event(self, payload) -> str:
+        event = payload.get("eventType", "")
+        if event == "Download" and payload.get("isUpgrade"):
+            return "Upgrade"
+        return event
+
+    def get_webhook_message(self, event, payload) -> Optional[str]:
+        if event not in WEBHOOK_EVENTS:
+            return None
+        item = payload.get(self.arr_variant.value) or {}
+        title = item.get("title", "Unknown")
+        if item.get("year"):
+            title += f" ({item.get('year')})"
+        episodes = [
+            f"S{e.get('seasonNumber', 0):02}E{e.get('episodeNumber', 0):02}"
+            for e in payload.get("episodes", [])
+        ]
+        if episodes:
+            title += " " + ", ".join(episodes[:3]) + ("…" if len(episodes) > 3 else "")
+
+        lines = [f"{WEBHOOK_EVENTS[event]} *{escape_markdownv2_chars(title)}*"]
+        file = (
+            payload.get("release")
+            or payload.get("movieFile")
+            or payload.get("episodeFile")
+            or {}
+        )
+        if isinstance(file.get("quality"), str):
+            lines.append(f"Quality: _{escape_markdownv2_chars(file['quality'])}_")
+        return "\n".join(lines)
+
+    async def sync_webhook_item(self, event, payload):
+        variant = self.arr_variant.value
+        self.cache.invalidate("queue")
+        self.queue_poller.wake()
+
+        id = (payload.get(variant) or {}).get("id")
+        if not id or event == "Grab":
+            return
+        self.cache.invalidate(variant)
+        if event in ["MovieDelete", "SeriesDelete"]:
+            self.library.remove(id)
+            self.lookup_cache.patch("id", id, None)
+            return
+        item = await self.request(f"{variant}/{id}", fallback=None)
+        if item:
+            self.library.upsert(pick(item, self.library_fields))
+            self.lookup_cache.patch("id", id, item)
+
+    async def handle_webhook(self, payload, application):
+        event = self.get_webhook_event(payload)
+        self.webhook_events[event] += 1
+        logger.debug(f"Received {event} webhook for {self.name}")
+        if event == "Test":
+            logger.info(f"Received test webhook for {self.name}")
+            return
+
+        await self.sync_webhook_item(event, payload)
+
+        message = self.get_webhook_message(event, payload)
+        if not message:
+            return
+        for chat_id in self.db.get_subscribers(self.name):
+            try:
+                await application.bot.send_message(
+                    chat_id,
+                    message,
+                    parse_mode="MarkdownV2",
+                    rate_limit_args={"priority": Priority.NOTIFICATION},
+                )
+            except Forbidden:
+                logger.info(f"Removing subscription of blocked chat {chat_id}")
+                self.db.remove_subscription(chat_id, self.name)
+            except TelegramError as e:
+                logger.warning(f"Failed to notify chat {chat_id}: {e!r}")
+
+    async def cmd_notify(self, update, context, args):
+        chat_id = update.message.chat_id
+        subscribed = chat_id in self.db.get_subscribers(self.name)
+        if len(args) > 1:
+            enable = args[1] == "on"
+        else:
+            enable = not subscribed
+
+        if enable:
+            self.db.add_subscription(chat_id, self.name)
+            message = "You will now be notified about grabs, downloads and deletions."
+        else:
+            self.db.remove_subscription(chat_id, self.name)
+            message = "You will no longer receive notifications."
+        return await update.message.reply_text(message)
+
     async def cmd_help(self, update, context, args):
         response_message = f"""
 *butlarr* - Help page for {type(self).__name__} service.
@@ -112,3 +508,16 @@ Following commands are available:
             response_message += f"\n - `/{self.commands[0]} {cmd} {escape_markdownv2_chars(pattern)}` \t _{escape_markdownv2_chars(desc)}_"
 
         return await update.message.reply_text(response_message, parse_mode="Markdown")
+
+    async def cmd_stats(self, update, context, args):
+        lines = [f"*{type(self).__name__}* statistics"]
+        for section, stats in self.get_stats().items():
+            lines += ["", f"*{escape_markdownv2_chars(section)}*"]
+            for key, value in stats.items():
+                key = escape_markdownv2_chars(key)
+                value = escape_markdownv2_chars(str(value))
+                lines.append(f" \\- {key}: `{value}`")
+
+        return await update.message.reply_text(
+            "\n".join(lines), parse_mode="MarkdownV2"
+        )
@@ -0,0 +1,40 @@
+import asyncio
+
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict
+
+
+@dataclass
+class SingleFlightStats:
+    calls: int = 0
+    coalesced: int = 0
+    in_flight: int = 0
+
+
+class SingleFlight:
+    """
+    Merges concurrent calls with the same key into a single call.
+    Every caller waiting on the key receives the result (or exception) of that call.
+    """
+
+    def __init__(self):
+        self.calls: Dict[Any, asyncio.Future] = {}
+        self.stats = SingleFlightStats()
+
+    def _done(self, key, task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        self.stats.in_flight = len(self.calls)
+
+    async def do(self, key, fn: Callable[[], Awaitable[Any]]):
+        task = self.calls.get(key)
+        if task:
+            self.stats.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._done(key, t))
+            self.calls[key] = task
+            self.stats.calls += 1
+            self.stats.in_flight = len(self.calls)
+        # Shield the shared call, a cancelled waiter must not cancel the others
+        return await asyncio.shield(task)
@@ -0,0 +1,142 @@
+import time
+
+from datetime import datetime, timezone
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from .stream import pick
+from .search import SearchIndex
+
+
+@dataclass
+class LibraryStats:
+    size: int = 0
+    synced: bool = False
+    sync_lag: Optional[float] = None
+    last_sync_duration: Optional[float] = None
+    full_syncs: int = 0
+    incremental_syncs: int = 0
+    updated_items: int = 0
+
+
+class LibraryMirror:
+    """
+    Local copy of a services library (all movies or series).
+    Starts with a full sync and afterwards only refreshes items that show up in the
+    history since the last sync. A full sync is repeated every `full_sync_interval`
+    seconds, to catch items added or removed outside of butlarr.
+    """
+
+    def __init__(self, service, full_sync_interval=3600):
+        self.service = service
+        self.full_sync_interval = full_sync_interval
+        self.items: Dict[Any, Dict[str, Any]] = {}
+        self.ids_by_key: Dict[Any, Any] = {}
+        self.index = SearchIndex()
+        self.synced = False
+        self.last_sync: Optional[datetime] = None
+        self.last_full_sync = 0.0
+        self.stats = LibraryStats()
+
+    @property
+    def variant(self):
+        return self.service.arr_variant.value
+
+    @property
+    def key(self):
+        return self.service.lookup_id_key
+
+    def _sync_done(self, started, sync_time):
+        self.last_sync = sync_time
+        self.stats.last_sync_duration = round(time.monotonic() - started, 3)
+        self.stats.size = len(self.items)
+
+    async def full_sync(self):
+        started = time.monotonic()
+        sync_time = datetime.now(timezone.utc)
+        items = {}
+        async for item in self.service.stream_library():
+            if item.get("id"):
+                items[item["id"]] = item
+        self.items = items
+        self.index.sync(items)
+        self.ids_by_key = {
+            i.get(self.key): id for id, i in self.items.items() if i.get(self.key)
+        }
+        self.synced = True
+        self.last_full_sync = started
+        self.stats.synced = True
+        self.stats.full_syncs += 1
+        self._sync_done(started, sync_time)
+        logger.debug(f"Synced {len(self.items)} {self.variant} items")
+
+    async def incremental_sync(self):
+        started = time.monotonic()
+        sync_time = datetime.now(timezone.utc)
+        history = await self.service.request(
+            "history/since",
+            params={"date": self.last_sync.isoformat()},
+            fallback=None,
+        )
+        if history is None:
+            return
+
+        changed = {h.get(f"{self.variant}Id") for h in history} - {None}
+        for id in changed:
+            item = await self.service.request(f"{self.variant}/{id}", fallback=None)
+            if item:
+                self.upsert(pick(item, self.service.library_fields))
+        self.stats.incremental_syncs += 1
+        self._sync_done(started, sync_time)
+
+    async def sync(self):
+        if (
+            not self.synced
+            or time.monotonic() - self.last_full_sync > self.full_sync_interval
+        ):
+            await self.full_sync()
+        else:
+            await self.incremental_sync()
+
+    def list(self) -> List[Dict[str, Any]]:
+        return list(self.items.values())
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        return [self.items[id] for id in self.index.search(query, limit)]
+
+    def get(self, id) -> Optional[Dict[str, Any]]:
+        return self.items.get(id)
+
+    def find(self, item) -> Optional[Dict[str, Any]]:
+        if item.get("id") in self.items:
+            return self.items[item["id"]]
+        if self.key and item.get(self.key) in self.ids_by_key:
+            return self.items.get(self.ids_by_key[item.get(self.key)])
+        return None
+
+    def rehydrate(self, item):
+        # Prefer the current library version of an item, if known
+        return self.find(item) or item
+
+    def upsert(self, item):
+        if item and item.get("id"):
+            self.items[item["id"]] = item
+            if self.key and item.get(self.key):
+                self.ids_by_key[item.get(self.key)] = item["id"]
+            self.index.add(item["id"], item)
+            self.stats.updated_items += 1
+            self.stats.size = len(self.items)
+
+    def remove(self, id):
+        item = self.items.pop(id, None)
+        self.index.remove(id)
+        if item and self.key:
+            self.ids_by_key.pop(item.get(self.key), None)
+        self.stats.size = len(self.items)
+
+    def get_stats(self):
+        if self.last_sync:
+            lag = datetime.now(timezone.utc) - self.last_sync
+            self.stats.sync_lag = round(lag.total_seconds(), 1)
+        return self.stats
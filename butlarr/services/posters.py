@@ -0,0 +1,189 @@
+import io
+import os
+import re
+import asyncio
+import hashlib
+import httpx
+
+from pathlib import Path
+from threading import Lock
+from dataclasses import dataclass
+from typing import Optional, Union
+from loguru import logger
+
+from .flight import SingleFlight
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DEFAULT_PATH = os.path.join(
+    Path(os.path.dirname(os.path.realpath(__file__))).parent.parent, "data", "posters"
+)
+TMDB_POSTER_WIDTHS = [92, 154, 185, 342, 500, 780]
+TMDB_SIZE_REGEX = re.compile(r"(image\.tmdb\.org/t/p/)(original|w\d+)/")
+
+
+def get_tmdb_url(url: str, min_width: int) -> str:
+    # TMDB serves every poster in multiple widths, use the smallest sufficient one
+    width = next((w for w in TMDB_POSTER_WIDTHS if w >= min_width), None)
+    if not width or not url:
+        return url
+    return TMDB_SIZE_REGEX.sub(rf"\g<1>w{width}/", url)
+
+
+@dataclass
+class PosterFetcherStats:
+    fetched: int = 0
+    disk_hits: int = 0
+    failed: int = 0
+    prefetched: int = 0
+    evicted: int = 0
+    cache_size: int = 0
+
+
+class PosterFetcher:
+    """
+    Fetches posters locally instead of letting telegram fetch the urls.
+    Posters are fetched in the smallest suitable size with bounded concurrency,
+    downscaled to a small JPEG (if Pillow is installed) and cached on disk.
+    The disk cache evicts the least recently used posters above max_cache_size.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_PATH,
+        max_cache_size: int = 100 * 1024 * 1024,
+        concurrency: int = 4,
+        max_width: int = 500,
+        quality: int = 80,
+        timeout: float = 10,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True, parents=True)
+        self.max_cache_size = max_cache_size
+        self.max_width = max_width
+        self.quality = quality
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.flights = SingleFlight()
+        self.lock = Lock()
+        self.tasks = set()
+        self.client = None
+        self.stats = PosterFetcherStats()
+        self.stats.cache_size = sum(
+            p.stat().st_size for p in self.cache_dir.glob("*.jpg")
+        )
+        if not Image:
+            logger.warning("Pillow is not installed, posters will not be downscaled")
+
+    def get_client(self):
+        if not self.client:
+            self.client = httpx.AsyncClient(
+                timeout=self.timeout, follow_redirects=True
+            )
+        return self.client
+
+    async def close(self):
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    def get_source_url(self, url: str) -> str:
+        return get_tmdb_url(url, self.max_width)
+
+    def get_path(self, url: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha1(url.encode()).hexdigest()}.jpg"
+
+    def is_cached(self, url: str):
+        return self.get_path(url).exists()
+
+    def read(self, path: Path) -> Optional[bytes]:
+        try:
+            data = path.read_bytes()
+            # The modification time orders the posters for eviction
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def write(self, path: Path, data: bytes):
+        with self.lock:
+            path.write_bytes(data)
+            self.stats.cache_size += len(data)
+            if self.stats.cache_size > self.max_cache_size:
+                self.evict()
+
+    def evict(self):
+        files = sorted(
+            ((p, p.stat()) for p in self.cache_dir.glob("*.jpg")),
+            key=lambda f: f[1].st_mtime,
+        )
+        size = sum(stat.st_size for _, stat in files)
+        # Evict a bit more than needed, to not evict on every write
+        target = self.max_cache_size * 0.9
+        for path, stat in files:
+            if size <= target:
+                break
+            path.unlink(missing_ok=True)
+            size -= stat.st_size
+            self.stats.evicted += 1
+        self.stats.cache_size = size
+
+    def downscale(self, data: bytes) -> Optional[bytes]:
+        if not Image:
+            return data
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image = image.convert("RGB")
+                image.thumbnail((self.max_width, self.max_width * 3))
+                output = io.BytesIO()
+                image.save(output, "JPEG", quality=self.quality, optimize=True)
+                return output.getvalue()
+        except Exception as e:
+            logger.debug(f"Could not downscale poster: {e!r}")
+            return None
+
+    async def fetch(self, url: str) -> Optional[Union[bytes, str]]:
+        path = self.get_path(url)
+        data = await asyncio.to_thread(self.read, path)
+        if data:
+            self.stats.disk_hits += 1
+            return data
+
+        async with self.semaphore:
+            try:
+                r = await self.get_client().get(self.get_source_url(url))
+            except httpx.TransportError as e:
+                # Possibly temporary, let telegram try the url itself
+                logger.debug(f"Could not fetch poster [{url}]: {e!r}")
+                return url
+        if r.status_code >= 500:
+            return url
+        if r.is_error or not r.headers.get("content-type", "").startswith("image/"):
+            self.stats.failed += 1
+            return None
+
+        data = await asyncio.to_thread(self.downscale, r.content)
+        if not data:
+            self.stats.failed += 1
+            return None
+        await asyncio.to_thread(self.write, path, data)
+        self.stats.fetched += 1
+        return data
+
+    async def get(self, url: str) -> Optional[Union[bytes, str]]:
+        """
+        Returns the poster bytes, the url itself if telegram should try to fetch it,
+        or None if the url does not point to a valid image.
+        """
+        return await self.flights.do(url, lambda: self.fetch(url))
+
+    def prefetch(self, url: str):
+        if url in self.flights.calls or self.is_cached(url):
+            return
+        self.stats.prefetched += 1
+        task = asyncio.ensure_future(self.get(url))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
@@ -0,0 +1,72 @@
+import math
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+from ..config.queue import WIDTH
+from ..tg_handler.markdown import escape_markdownv2_chars
+
+TITLE_LINE = r"{}\. *{}*".format
+PROGRESS_LINE = r">`[{}|{}]` {}%".format
+STATUS_LINE = r">Status: _{}_ \(_{}_\)   Time left: _{}_".format
+
+
+@dataclass
+class QueueRendererStats:
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+
+
+class QueueRenderer:
+    """
+    Renders queue records as MarkdownV2 lines using precompiled templates.
+    The escaped title and status are cached per record id, as they rarely change
+    between polls (unlike the progress and the time left).
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.records: OrderedDict[Any, Tuple[Tuple, Tuple]] = OrderedDict()
+        self.stats = QueueRendererStats()
+
+    def get_escaped(self, item: Dict[str, Any]) -> Tuple[str, str, str]:
+        raw = (
+            item.get("title", ""),
+            item.get("status", "N/A"),
+            item.get("trackedDownloadState", "-"),
+        )
+        id = item.get("id")
+        cached = self.records.get(id)
+        if cached and cached[0] == raw:
+            self.records.move_to_end(id)
+            self.stats.hits += 1
+            return cached[1]
+
+        self.stats.misses += 1
+        escaped = (
+            escape_markdownv2_chars(raw[0][0 : 2 * WIDTH]),
+            escape_markdownv2_chars(raw[1]),
+            escape_markdownv2_chars(raw[2]),
+        )
+        if id is not None:
+            self.records[id] = (raw, escaped)
+            self.records.move_to_end(id)
+            while len(self.records) > self.max_size:
+                self.records.popitem(last=False)
+            self.stats.size = len(self.records)
+        return escaped
+
+    def render(self, item: Dict[str, Any], position: int) -> Tuple[str, str, str]:
+        (title, status, state) = self.get_escaped(item)
+        percent = 1.0 - (float(item.get("sizeleft", 0)) / (item.get("size") or 1))
+        progress = math.floor(percent * WIDTH)
+        remaining = math.ceil((1.0 - percent) * WIDTH)
+        return (
+            TITLE_LINE(position, title),
+            PROGRESS_LINE(progress * "=", remaining * " ", round(percent * 100)),
+            STATUS_LINE(
+                status, state, escape_markdownv2_chars(item.get("timeleft", "N/A"))
+            ),
+        )
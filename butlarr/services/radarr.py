@@ -1,9 +1,17 @@
 from loguru import logger
-from typing import Optional, List, Any, Literal
+from typing import Optional, List, Any, Literal, Tuple
 from dataclasses import dataclass, replace
 
-from . import ArrService, ArrVariant, Action, ServiceContent, find_first
-from .ext import ExtArrService, QueueState
+from . import (
+    ArrService,
+    ArrVariant,
+    Action,
+    ServiceContent,
+    find_first,
+    get_poster_url,
+)
+from .client import ClientConfig
+from .ext import ExtArrService, QueueState, BULK_MENUS
 from ..tg_handler import command, callback, handler
 from ..tg_handler.message import (
     Response,
@@ -28,27 +36,51 @@ class State:
     menu: Optional[
         Literal["path"] | Literal["tags"] | Literal["quality_profile"] | Literal["add"]
     ]
+    selected: Tuple[int, ...] = ()
 
 
 @handler
 class Radarr(ExtArrService, ArrService):
+    library_fields = [
+        "id",
+        "title",
+        "sortTitle",
+        "alternateTitles",
+        "year",
+        "runtime",
+        "status",
+        "overview",
+        "remotePoster",
+        "images",
+        "imdbId",
+        "tmdbId",
+        "folderName",
+        "path",
+        "qualityProfileId",
+        "tags",
+        "monitored",
+        "hasFile",
+    ]
+
     def __init__(
         self,
         commands: List[str],
         api_host: str,
         api_key: str,
+        http_config: ClientConfig = ClientConfig(),
     ):
-        self.commands = commands
-        self.api_key = api_key
-
-        self.api_version = self.detect_api(api_host)
+        super().__init__(
+            commands=commands,
+            api_host=api_host,
+            api_key=api_key,
+            http_config=http_config,
+        )
         self.service_content = ServiceContent.MOVIE
         self.arr_variant = ArrVariant.RADARR
-        self.root_folders = self.get_root_folders()
-        self.quality_profiles = self.get_quality_profiles()
+        self.lookup_id_key = "tmdbId"
 
-    @keyboard
-    def keyboard(self, state: State, allow_edit=False):
+    @keyboard(key=lambda self, *args, **kwargs: self.get_keyboard_key(*args, **kwargs))
+    async def keyboard(self, state: State, allow_edit=False):
         item = state.items[state.index]
         in_library = "id" in item and item["id"]
 
@@ -81,7 +113,7 @@ class Radarr(ExtArrService, ArrService):
 
         elif state.menu == "tags":
             row_navigation = [Button("=== Selecting Tags ===")]
-            tags = self.get_tags() or []
+            tags = await self.get_tags() or []
             rows_menu = [
                 (
                     [
@@ -103,28 +135,10 @@ class Radarr(ExtArrService, ArrService):
                     )
                 ],
             ]
-        elif state.menu == "path":
-            row_navigation = [Button("=== Selecting Root Folder ===")]
-            rows_menu = [
-                [
-                    Button(
-                        p.get("path", "-"),
-                        self.get_clbk("selectpath", p.get("id")),
-                    )
-                ]
-                for p in self.root_folders
-            ]
-        elif state.menu == "quality":
-            row_navigation = [Button("=== Selecting Quality Profile ===")]
-            rows_menu = [
-                [
-                    Button(
-                        p.get("name", "-"),
-                        self.get_clbk("selectquality", p.get("id")),
-                    )
-                ]
-                for p in self.quality_profiles
-            ]
+        elif state.menu in ["path", "quality", "language"]:
+            (row_navigation, rows_menu) = self.get_metadata_menu(state.menu)
+        elif state.menu in BULK_MENUS:
+            (row_navigation, rows_menu) = await self.get_bulk_keyboard(state)
         else:
             if in_library:
                 monitored = item.get("monitored", True)
@@ -135,6 +149,8 @@ class Radarr(ExtArrService, ArrService):
                         Button("💾 Missing" if missing else "Downloaded"),
                     ]
                 ]
+            if allow_edit:
+                rows_menu = [*rows_menu, self.get_selection_row(state)]
             row_navigation = [
                 (
                     Button("⬅ Prev", self.get_clbk("goto", state.index - 1))
@@ -203,7 +219,7 @@ class Radarr(ExtArrService, ArrService):
 
         return [row_navigation, *rows_menu, *rows_action]
 
-    def create_message(self, state: State, full_redraw=False, allow_edit=False):
+    async def create_message(self, state: State, full_redraw=False, allow_edit=False):
         if not state.items:
             return Response(
                 caption="No movies found",
@@ -212,20 +228,12 @@ class Radarr(ExtArrService, ArrService):
 
         item = state.items[state.index]
 
-        keyboard_markup = self.keyboard(state, allow_edit=allow_edit)
+        keyboard_markup = await self.keyboard(state, allow_edit=allow_edit)
 
-        reply_message = f"{item['title']} "
-        if item["year"] and str(item["year"]) not in item["title"]:
-            reply_message += f"({item['year']}) "
-
-        if item["runtime"]:
-            reply_message += f"{item['runtime']}min "
-
-        reply_message += f"- {item['status'].title()}\n\n{item.get('overview', '')}"
-        reply_message = reply_message[0:1024]
-        cover_url = item.get("remotePoster")
-        if not cover_url and len(item.get("images")):
-            cover_url = item.get("images")[0]["remoteUrl"]
+        reply_message = self.get_caption(item)
+        cover_url = get_poster_url(item)
+        if full_redraw:
+            self.prefetch_posters(state)
 
         return Response(
             photo=cover_url if full_redraw else None,
@@ -258,6 +266,12 @@ class Radarr(ExtArrService, ArrService):
             menu=None,
         )
 
+    def get_bulk_add_args(self, state: State):
+        return {
+            **super().get_bulk_add_args(state),
+            "options": {"addOptions": {"searchForMovie": False}},
+        }
+
     @repaint
     @command(
         default=True,
@@ -271,23 +285,35 @@ class Radarr(ExtArrService, ArrService):
         if len(args) > 1 and args[0] == "search":
             args = args[1:]
         title = " ".join(args)
-        items = self.lookup(title)
+        items = await self.lookup(title)
         state = self._get_initial_state(items)
 
         self.session_db.add_session_entry(
             default_session_state_key_fn(self, update), state
         )
 
-        auth_level = get_auth_level_from_message(self.db, update)
+        auth_level = get_auth_level_from_message(self.db, update, context)
         allow_edit = auth_level >= AuthLevels.MOD.value
-        return self.create_message(state, full_redraw=True, allow_edit=allow_edit)
+        return await self.create_message(
+            state, full_redraw=True, allow_edit=allow_edit
+        )
 
     @command(cmds=[("help", "", "Shows only the radarr help page")])
     async def cmd_help(self, update, context, args):
         return await ExtArrService.cmd_help(self, update, context, args)
 
+    @command(cmds=[("stats", "", "Shows radarr api statistics")])
+    @authorized(min_auth_level=AuthLevels.MOD)
+    async def cmd_stats(self, update, context, args):
+        return await ExtArrService.cmd_stats(self, update, context, args)
+
+    @command(cmds=[("notify", "[on|off]", "Toggles radarr event notifications")])
+    @authorized(min_auth_level=AuthLevels.USER)
+    async def cmd_notify(self, update, context, args):
+        return await ExtArrService.cmd_notify(self, update, context, args)
+
     @repaint
-    @command(cmds=[("queue", "", "Shows the radarr download queue")])
+    @command(cmds=[("queue", "[watch]", "Shows the radarr download queue")])
     @authorized(min_auth_level=AuthLevels.USER)
     async def cmd_queue(self, update, context, args):
         return await ExtArrService.cmd_queue(self, update, context, args)
@@ -296,16 +322,38 @@ class Radarr(ExtArrService, ArrService):
     @command(cmds=[("list", "", "List all series in the library")])
     @authorized(min_auth_level=AuthLevels.USER.value)
     async def cmd_list(self, update, context, args):
-        items = self.list_()
+        items = await self.list_library()
+
+        state = self._get_initial_state(items)
+        self.session_db.add_session_entry(
+            default_session_state_key_fn(self, update), state
+        )
+
+        auth_level = get_auth_level_from_message(self.db, update, context)
+        allow_edit = auth_level >= AuthLevels.MOD.value
+        return await self.create_message(
+            state, full_redraw=True, allow_edit=allow_edit
+        )
+
+    @repaint
+    @command(cmds=[("find", "<title>", "Search for a movie in the library")])
+    @authorized(min_auth_level=AuthLevels.USER.value)
+    async def cmd_find(self, update, context, args):
+        await self.ensure_available()
+        if not self.library.synced:
+            return Response(caption="Library is not synced yet, try again shortly.")
+        items = self.library.search(" ".join(args[1:]))
 
         state = self._get_initial_state(items)
         self.session_db.add_session_entry(
             default_session_state_key_fn(self, update), state
         )
 
-        auth_level = get_auth_level_from_message(self.db, update)
+        auth_level = get_auth_level_from_message(self.db, update, context)
         allow_edit = auth_level >= AuthLevels.MOD.value
-        return self.create_message(state, full_redraw=True, allow_edit=allow_edit)
+        return await self.create_message(
+            state, full_redraw=True, allow_edit=allow_edit
+        )
 
     @repaint
     @callback(cmds=["queue"])
@@ -313,6 +361,12 @@ class Radarr(ExtArrService, ArrService):
     async def clbk_queue(self, update, context, args):
         return await ExtArrService.clbk_queue(self, update, context, args)
 
+    @repaint
+    @callback(cmds=["unwatch"])
+    @authorized(min_auth_level=AuthLevels.USER)
+    async def clbk_unwatch(self, update, context, args):
+        return await ExtArrService.clbk_unwatch(self, update, context, args)
+
     @repaint
     @callback(
         cmds=[
@@ -325,12 +379,17 @@ class Radarr(ExtArrService, ArrService):
             "quality",
             "selectquality",
             "addmenu",
+            "select",
+            "bulk",
+            "bulkquality",
+            "bulktags",
+            "bulkclear",
         ]
     )
     @sessionState()
     @authorized(min_auth_level=AuthLevels.USER)
     async def clbk_update(self, update, context, args, state):
-        auth_level = get_auth_level_from_message(self.db, update)
+        auth_level = get_auth_level_from_message(self.db, update, context)
         allow_edit = auth_level >= AuthLevels.MOD.value
         # Prevent any changes from being made if in library and permission level below MOD
         if args[0] in ["addtag", "remtag", "selectpath", "selectquality"]:
@@ -338,14 +397,18 @@ class Radarr(ExtArrService, ArrService):
             if "id" in item and item["id"] and not allow_edit:
                 # Don't do anything, illegal operation
                 return Response(caption="You are missing the permissions for this operation.")
+        if args[0] in ["select", *BULK_MENUS, "bulkclear"] and not allow_edit:
+            return Response(caption="You are missing the permissions for this operation.")
 
         full_redraw = False
         if args[0] == "goto":
             if len(args) > 1:
                 idx = int(args[1])
-                item = state.items[idx]
+                item = self.library.rehydrate(state.items[idx])
+                items = [*state.items[:idx], item, *state.items[idx + 1 :]]
                 state = replace(
                     state,
+                    items=items,
                     index=idx,
                     root_folder=find_first(
                         self.root_folders,
@@ -370,17 +433,19 @@ class Radarr(ExtArrService, ArrService):
         elif args[0] == "path":
             state = replace(state, menu="path")
         elif args[0] == "selectpath":
-            path = self.get_root_folder(args[1])
+            path = await self.get_root_folder(args[1])
             state = replace(state, root_folder=path, menu="add")
         elif args[0] == "quality":
             state = replace(state, menu="quality")
         elif args[0] == "selectquality":
-            quality_profile = self.get_quality_profile(args[1])
+            quality_profile = await self.get_quality_profile(args[1])
             state = replace(state, quality_profile=quality_profile, menu="add")
         elif args[0] == "addmenu":
             state = replace(state, menu="add")
+        elif args[0] in ["select", *BULK_MENUS, "bulkclear"]:
+            state = self.get_bulk_state(state, args)
 
-        return self.create_message(
+        return await self.create_message(
             state, full_redraw=full_redraw, allow_edit=allow_edit
         )
 
@@ -389,7 +454,7 @@ class Radarr(ExtArrService, ArrService):
     @sessionState(clear=True)
     @authorized(min_auth_level=AuthLevels.USER)
     async def clbk_add(self, update, context, args, state):
-        result = self.add(
+        result = await self.add(
             item=state.items[state.index],
             quality_profile_id=state.quality_profile.get("id"),
             root_folder_path=state.root_folder.get("path"),
@@ -402,6 +467,13 @@ class Radarr(ExtArrService, ArrService):
         return Response(caption="Movie updated!" if state.items[state.index].get("id")
                                     else "Movie added!")
 
+    @clear
+    @callback(cmds=["bulkedit", "bulkadd"])
+    @sessionState(clear=True)
+    @authorized(min_auth_level=AuthLevels.MOD)
+    async def clbk_bulk(self, update, context, args, state):
+        return Response(caption=await self.bulk_update(state, args))
+
     @clear
     @callback(cmds=["cancel"])
     @sessionState(clear=True)
@@ -414,5 +486,5 @@ class Radarr(ExtArrService, ArrService):
     @sessionState(clear=True)
     @authorized(min_auth_level=AuthLevels.MOD)
     async def clbk_remove(self, update, context, args, state):
-        self.remove(id=state.items[state.index].get("id"))
+        await self.remove(id=state.items[state.index].get("id"))
         return Response(caption="Movie removed!")
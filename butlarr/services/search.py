@@ -0,0 +1,131 @@
+import re
+import unicodedata
+
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+YEAR_PATTERN = re.compile(r"^(19|20)\d\d$")
+
+
+def normalize(text: str):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    titles: Tuple[str, ...]
+    year: Optional[int]
+    trigrams: frozenset
+    tokens: frozenset
+    title_size: int
+
+
+def get_source(item: Dict[str, Any]) -> Tuple:
+    # The fields an entry is created from, cheap to compare
+    return (
+        item.get("title", ""),
+        tuple(t.get("title", "") for t in item.get("alternateTitles") or []),
+        item.get("year"),
+    )
+
+
+def create_entry(item: Dict[str, Any]) -> IndexEntry:
+    titles = [item.get("title", "")]
+    titles += [t.get("title", "") for t in item.get("alternateTitles") or []]
+    titles = tuple(dict.fromkeys(normalize(t) for t in titles if t))
+    return IndexEntry(
+        titles=titles,
+        year=item.get("year") or None,
+        trigrams=frozenset().union(*[trigrams(t) for t in titles]),
+        tokens=frozenset(" ".join(titles).split()),
+        title_size=len(trigrams(titles[0])) if titles else 1,
+    )
+
+
+class SearchIndex:
+    """
+    Trigram and token index over titles, alternate titles and years of library items.
+    Items are (re-)indexed one by one, so the index follows the library incrementally.
+    """
+
+    def __init__(self):
+        self.entries: Dict[Any, IndexEntry] = {}
+        self.sources: Dict[Any, Tuple] = {}
+        self.by_trigram: Dict[str, Set[Any]] = defaultdict(set)
+        self.by_token: Dict[str, Set[Any]] = defaultdict(set)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, id, item: Dict[str, Any]):
+        # Unchanged items are skipped before normalizing their titles
+        source = get_source(item)
+        if self.sources.get(id) == source:
+            return
+        entry = create_entry(item)
+        self.remove(id)
+        self.entries[id] = entry
+        self.sources[id] = source
+        for t in entry.trigrams:
+            self.by_trigram[t].add(id)
+        for t in entry.tokens:
+            self.by_token[t].add(id)
+
+    def remove(self, id):
+        self.sources.pop(id, None)
+        entry = self.entries.pop(id, None)
+        if not entry:
+            return
+        for t in entry.trigrams:
+            self.by_trigram[t].discard(id)
+            if not self.by_trigram[t]:
+                del self.by_trigram[t]
+        for t in entry.tokens:
+            self.by_token[t].discard(id)
+            if not self.by_token[t]:
+                del self.by_token[t]
+
+    def sync(self, items: Dict[Any, Dict[str, Any]]):
+        for id in [id for id in self.entries if id not in items]:
+            self.remove(id)
+        for id, item in items.items():
+            self.add(id, item)
+
+    def search(self, query: str, limit: int = 10) -> List[Any]:
+        tokens = normalize(query).split()
+        years = {int(t) for t in tokens if YEAR_PATTERN.match(t)}
+        text = " ".join(t for t in tokens if not YEAR_PATTERN.match(t))
+        if not text:
+            # Titles can be years themselves, e.g. 1917
+            text = " ".join(tokens)
+        if not text:
+            return []
+
+        query_trigrams = trigrams(text)
+        overlap = Counter()
+        for t in query_trigrams:
+            overlap.update(self.by_trigram.get(t, ()))
+
+        scores = {}
+        min_overlap = max(1, len(query_trigrams) // 3)
+        for id, count in overlap.items():
+            if count < min_overlap:
+                continue
+            entry = self.entries[id]
+            # How much of the query is matched, and how much of the main title
+            score = count / len(query_trigrams)
+            score += 0.5 * min(count / entry.title_size, 1)
+            score += 0.25 * len([t for t in tokens if t in entry.tokens])
+            if years and entry.year in years:
+                score += 1
+            scores[id] = score
+
+        return sorted(scores, key=scores.get, reverse=True)[:limit]
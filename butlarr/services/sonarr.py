@@ -1,9 +1,17 @@
 from loguru import logger
-from typing import Optional, List, Any, Literal
+from typing import Optional, List, Any, Literal, Tuple
 from dataclasses import dataclass, replace
 
-from . import ArrService, ArrVariant, Action, ServiceContent, find_first
-from .ext import ExtArrService
+from . import (
+    ArrService,
+    ArrVariant,
+    Action,
+    ServiceContent,
+    find_first,
+    get_poster_url,
+)
+from .client import ClientConfig
+from .ext import ExtArrService, BULK_MENUS
 from ..tg_handler import command, callback, handler
 from ..tg_handler.message import (
     Response,
@@ -40,25 +48,61 @@ class State:
         | Literal["language"]
         | Literal["add"]
     ]
+    selected: Tuple[int, ...] = ()
 
 
 @handler
 class Sonarr(ExtArrService, ArrService):
+    library_fields = [
+        "id",
+        "title",
+        "sortTitle",
+        "alternateTitles",
+        "year",
+        "runtime",
+        "status",
+        "overview",
+        "remotePoster",
+        "images",
+        "imdbId",
+        "tmdbId",
+        "folderName",
+        "path",
+        "qualityProfileId",
+        "tags",
+        "monitored",
+        "hasFile",
+        "tvdbId",
+        "languageProfileId",
+        "seasons",
+    ]
+    metadata_resources = {
+        **ArrService.metadata_resources,
+        "language_profiles": "languageprofile",
+    }
+
     def __init__(
         self,
         commands: List[str],
         api_host: str,
         api_key: str,
+        http_config: ClientConfig = ClientConfig(),
     ):
-        self.commands = commands
-        self.api_key = api_key
-
-        self.api_version = self.detect_api(api_host)
+        super().__init__(
+            commands=commands,
+            api_host=api_host,
+            api_key=api_key,
+            http_config=http_config,
+        )
         self.service_content = ServiceContent.SERIES
         self.arr_variant = ArrVariant.SONARR
-        self.root_folders = self.get_root_folders()
-        self.quality_profiles = self.get_quality_profiles()
-        self.language_profiles = self.get_language_profiles()
+        self.lookup_id_key = "tvdbId"
+
+    def get_selected_metadata(self, state):
+        return (
+            *super().get_selected_metadata(state),
+            state.language_profile.get("name"),
+        )
 
     def _get_season_state(self, item):
         available_seasons = [e.get("seasonNumber") for e in item.get("seasons")]
@@ -69,8 +113,8 @@ class Sonarr(ExtArrService, ArrService):
             monitored_seasons,
         )
 
-    @keyboard
-    def keyboard(self, state: State, allow_edit=None):
+    @keyboard(key=lambda self, *args, **kwargs: self.get_keyboard_key(*args, **kwargs))
+    async def keyboard(self, state: State, allow_edit=None):
         item = state.items[state.index]
         in_library = "id" in item and item["id"]
 
@@ -127,7 +171,7 @@ class Sonarr(ExtArrService, ArrService):
             ]
         elif state.menu == "tags":
             row_navigation = [Button("=== Selecting Tags ===")]
-            tags = self.get_tags() or []
+            tags = await self.get_tags() or []
             rows_menu = [
                 (
                     [
@@ -149,39 +193,10 @@ class Sonarr(ExtArrService, ArrService):
                     )
                 ],
             ]
-        elif state.menu == "path":
-            row_navigation = [Button("=== Selecting Root Folder ===")]
-            rows_menu = [
-                [
-                    Button(
-                        p.get("path", "-"),
-                        self.get_clbk("selectpath", p.get("id")),
-                    )
-                ]
-                for p in self.root_folders
-            ]
-        elif state.menu == "quality":
-            row_navigation = [Button("=== Selecting Quality Profile ===")]
-            rows_menu = [
-                [
-                    Button(
-                        p.get("name", "-"),
-                        self.get_clbk("selectquality", p.get("id")),
-                    )
-                ]
-                for p in self.quality_profiles
-            ]
-        elif state.menu == "language":
-            row_navigation = [Button("=== Selecting Language Profile ===")]
-            rows_menu = [
-                [
-                    Button(
-                        p.get("name", "-"),
-                        self.get_clbk("selectlanguage", p.get("id")),
-                    )
-                ]
-                for p in self.language_profiles
-            ]
+        elif state.menu in ["path", "quality", "language"]:
+            (row_navigation, rows_menu) = self.get_metadata_menu(state.menu)
+        elif state.menu in BULK_MENUS:
+            (row_navigation, rows_menu) = await self.get_bulk_keyboard(state)
         else:
             if in_library:
                 monitored = item.get("monitored", True)
@@ -199,6 +214,8 @@ class Sonarr(ExtArrService, ArrService):
                         Button("💾 Missing" if missing else "Downloaded"),
                     ],
                 ]
+            if allow_edit:
+                rows_menu = [*rows_menu, self.get_selection_row(state)]
             row_navigation = [
                 (
                     Button("⬅ Prev", self.get_clbk("goto", state.index - 1))
@@ -276,7 +293,7 @@ class Sonarr(ExtArrService, ArrService):
                         "🔙 Back",
                         self.get_clbk(
                             "goto"
-                            if state.menu and state.menu == "seasons"
+                            if state.menu and state.menu in ["seasons", *BULK_MENUS]
                             else (
                                 "addmenu"
                                 if state.menu and state.menu != "add"
@@ -291,7 +308,7 @@ class Sonarr(ExtArrService, ArrService):
 
         return [row_navigation, *rows_menu, *rows_action]
 
-    def create_message(self, state: State, full_redraw=False, allow_edit=False):
+    async def create_message(self, state: State, full_redraw=False, allow_edit=False):
         if not state.items:
             return Response(
                 caption="No series found",
@@ -300,21 +317,13 @@ class Sonarr(ExtArrService, ArrService):
 
         item = state.items[state.index]
 
-        keyboard_markup = self.keyboard(state, allow_edit=allow_edit)
+        keyboard_markup = await self.keyboard(state, allow_edit=allow_edit)
 
-        reply_message = f"{item['title']} "
-        if item["year"] and str(item["year"]) not in item["title"]:
-            reply_message += f"({item['year']}) "
+        reply_message = self.get_caption(item)
 
-        if item["runtime"]:
-            reply_message += f"{item['runtime']}min "
-
-        reply_message += f"- {item['status'].title()}\n\n{item.get('overview', '')}"
-        reply_message = reply_message[0:1024]
-
-        cover_url = item.get("remotePoster")
-        if not cover_url and len(item.get("images")):
-            cover_url = item.get("images")[0]["remoteUrl"]
+        cover_url = get_poster_url(item)
+        if full_redraw:
+            self.prefetch_posters(state)
 
         return Response(
             photo=cover_url if full_redraw else None,
@@ -353,9 +362,19 @@ class Sonarr(ExtArrService, ArrService):
             ),
             tags=items[0].get("tags", []) if items else None,
             menu=None,
-            seasons=self._get_season_state(items[0]),
+            seasons=self._get_season_state(items[0]) if items else None,
         )
 
+    def get_bulk_add_args(self, state: State):
+        return {
+            "quality_profile_id": state.quality_profile.get("id", 0),
+            "language_profile_id": state.language_profile.get("id", 0),
+            "root_folder_path": state.root_folder.get("path", ""),
+            "options": {
+                "addOptions": {"searchForMissingEpisodes": False, "monitor": "all"}
+            },
+        }
+
     @repaint
     @command(
         default=True,
@@ -370,7 +389,7 @@ class Sonarr(ExtArrService, ArrService):
             args = args[1:]
         title = " ".join(args)
 
-        items = self.lookup(title)
+        items = await self.lookup(title)
 
         state = self._get_initial_state(items)
 
@@ -378,16 +397,28 @@ class Sonarr(ExtArrService, ArrService):
             default_session_state_key_fn(self, update), state
         )
 
-        auth_level = get_auth_level_from_message(self.db, update)
+        auth_level = get_auth_level_from_message(self.db, update, context)
         allow_edit = auth_level >= AuthLevels.MOD.value
-        return self.create_message(state, full_redraw=True, allow_edit=allow_edit)
+        return await self.create_message(
+            state, full_redraw=True, allow_edit=allow_edit
+        )
 
     @command(cmds=[("help", "", "Shows only the sonarr help page")])
     async def cmd_help(self, update, context, args):
         return await ExtArrService.cmd_help(self, update, context, args)
 
+    @command(cmds=[("stats", "", "Shows sonarr api statistics")])
+    @authorized(min_auth_level=AuthLevels.MOD.value)
+    async def cmd_stats(self, update, context, args):
+        return await ExtArrService.cmd_stats(self, update, context, args)
+
+    @command(cmds=[("notify", "[on|off]", "Toggles sonarr event notifications")])
+    @authorized(min_auth_level=AuthLevels.USER.value)
+    async def cmd_notify(self, update, context, args):
+        return await ExtArrService.cmd_notify(self, update, context, args)
+
     @repaint
-    @command(cmds=[("queue", "", "Shows the sonarr download queue")])
+    @command(cmds=[("queue", "[watch]", "Shows the sonarr download queue")])
     @authorized(min_auth_level=AuthLevels.USER.value)
     async def cmd_queue(self, update, context, args):
         return await ExtArrService.cmd_queue(self, update, context, args)
@@ -398,20 +429,48 @@ class Sonarr(ExtArrService, ArrService):
     async def clbk_queue(self, update, context, args):
         return await ExtArrService.clbk_queue(self, update, context, args)
 
+    @repaint
+    @callback(cmds=["unwatch"])
+    @authorized(min_auth_level=AuthLevels.USER.value)
+    async def clbk_unwatch(self, update, context, args):
+        return await ExtArrService.clbk_unwatch(self, update, context, args)
+
     @repaint
     @command(cmds=[("list", "", "List all series in the library")])
     @authorized(min_auth_level=AuthLevels.USER.value)
     async def cmd_list(self, update, context, args):
-        items = self.list_()
+        items = await self.list_library()
+
+        state = self._get_initial_state(items)
+        self.session_db.add_session_entry(
+            default_session_state_key_fn(self, update), state
+        )
+
+        auth_level = get_auth_level_from_message(self.db, update, context)
+        allow_edit = auth_level >= AuthLevels.MOD.value
+        return await self.create_message(
+            state, full_redraw=True, allow_edit=allow_edit
+        )
+
+    @repaint
+    @command(cmds=[("find", "<title>", "Search for a series in the library")])
+    @authorized(min_auth_level=AuthLevels.USER.value)
+    async def cmd_find(self, update, context, args):
+        await self.ensure_available()
+        if not self.library.synced:
+            return Response(caption="Library is not synced yet, try again shortly.")
+        items = self.library.search(" ".join(args[1:]))
 
         state = self._get_initial_state(items)
         self.session_db.add_session_entry(
             default_session_state_key_fn(self, update), state
         )
 
-        auth_level = get_auth_level_from_message(self.db, update)
+        auth_level = get_auth_level_from_message(self.db, update, context)
         allow_edit = auth_level >= AuthLevels.MOD.value
-        return self.create_message(state, full_redraw=True, allow_edit=allow_edit)
+        return await self.create_message(
+            state, full_redraw=True, allow_edit=allow_edit
+        )
 
     @repaint
     @callback(
@@ -429,12 +488,17 @@ class Sonarr(ExtArrService, ArrService):
             "language",
             "selectlanguage",
             "addmenu",
+            "select",
+            "bulk",
+            "bulkquality",
+            "bulktags",
+            "bulkclear",
         ]
     )
     @sessionState()
     @authorized(min_auth_level=AuthLevels.USER)
     async def clbk_update(self, update, context, args, state):
-        auth_level = get_auth_level_from_message(self.db, update)
+        auth_level = get_auth_level_from_message(self.db, update, context)
         allow_edit = auth_level >= AuthLevels.MOD.value
         # Prevent any changes from being made if in library and permission level below MOD
         if args[0] in [
@@ -449,14 +513,18 @@ class Sonarr(ExtArrService, ArrService):
             if "id" in item and item["id"] and not allow_edit:
                 # Don't do anything, illegal operation
                 return Response(caption="You are missing the permissions for this operation.")
+        if args[0] in ["select", *BULK_MENUS, "bulkclear"] and not allow_edit:
+            return Response(caption="You are missing the permissions for this operation.")
 
         full_redraw = False
         if args[0] == "goto":
             if len(args) > 1:
                 idx = int(args[1])
-                item = state.items[idx]
+                item = self.library.rehydrate(state.items[idx])
+                items = [*state.items[:idx], item, *state.items[idx + 1 :]]
                 state = replace(
                     state,
+                    items=items,
                     index=idx,
                     root_folder=find_first(
                         self.root_folders,
@@ -476,7 +544,7 @@ class Sonarr(ExtArrService, ArrService):
         elif args[0] == "seasons":
             state = replace(state, menu="seasons")
         elif args[0] == "searchseason":
-            self.request(
+            await self.request(
                 "command",
                 action=Action.POST,
                 params={
@@ -497,22 +565,24 @@ class Sonarr(ExtArrService, ArrService):
         elif args[0] == "path":
             state = replace(state, menu="path")
         elif args[0] == "selectpath":
-            path = self.get_root_folder(args[1])
+            path = await self.get_root_folder(args[1])
             state = replace(state, root_folder=path, menu="add")
         elif args[0] == "quality":
             state = replace(state, menu="quality")
         elif args[0] == "selectquality":
-            quality_profile = self.get_quality_profile(args[1])
+            quality_profile = await self.get_quality_profile(args[1])
             state = replace(state, quality_profile=quality_profile, menu="add")
         elif args[0] == "language":
             state = replace(state, menu="language")
         elif args[0] == "selectlanguage":
-            language_profile = self.get_language_profile(args[1])
+            language_profile = await self.get_language_profile(args[1])
             state = replace(state, language_profile=language_profile, menu="add")
         elif args[0] == "addmenu":
             state = replace(state, menu="add")
+        elif args[0] in ["select", *BULK_MENUS, "bulkclear"]:
+            state = self.get_bulk_state(state, args)
 
-        return self.create_message(
+        return await self.create_message(
             state, full_redraw=full_redraw, allow_edit=allow_edit
         )
 
@@ -521,7 +591,7 @@ class Sonarr(ExtArrService, ArrService):
     @sessionState(clear=True)
     @authorized(min_auth_level=AuthLevels.USER)
     async def clbk_add(self, update, context, args, state):
-        result = self.add(
+        result = await self.add(
             item=state.items[state.index],
             quality_profile_id=state.quality_profile.get("id", 0),
             language_profile_id=state.language_profile.get("id", 0),
@@ -545,6 +615,13 @@ class Sonarr(ExtArrService, ArrService):
             )
         )
 
+    @clear
+    @callback(cmds=["bulkedit", "bulkadd"])
+    @sessionState(clear=True)
+    @authorized(min_auth_level=AuthLevels.MOD)
+    async def clbk_bulk(self, update, context, args, state):
+        return Response(caption=await self.bulk_update(state, args))
+
     @clear
     @callback(cmds=["cancel"])
     @sessionState(clear=True)
@@ -557,5 +634,5 @@ class Sonarr(ExtArrService, ArrService):
     @sessionState(clear=True)
     @authorized(min_auth_level=AuthLevels.USER)
     async def clbk_remove(self, update, context, args, state):
-        self.remove(id=state.items[state.index].get("id"))
+        await self.remove(id=state.items[state.index].get("id"))
         return Response(caption="Series removed!")
@@ -0,0 +1,64 @@
+import json
+import codecs
+
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+WHITESPACE = " \t\r\n"
+NUMBER = "0123456789+-.eE"
+
+
+def pick(item: Dict[str, Any], fields: Optional[List[str]]):
+    if not fields:
+        return item
+    return {k: item[k] for k in fields if k in item}
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]):
+    """
+    Incrementally parses a json array, yielding each element once it is complete.
+    Only the currently incomplete element is kept in memory.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+    finished = False
+
+    async for chunk in chunks:
+        buffer += utf8.decode(chunk)
+        pos = 0
+        while not finished:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE + ",":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a json array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                finished = True
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Element is not complete yet, wait for more data
+                break
+            while end < len(buffer) and buffer[end] in WHITESPACE:
+                end += 1
+            if end >= len(buffer):
+                # Numbers may continue in the next chunk, wait for the separator
+                break
+            if buffer[end] not in ",]":
+                if not buffer[end:].strip(NUMBER):
+                    # Number cut within its fraction or exponent
+                    break
+                raise ValueError("Expected , or ] after a json array element")
+            pos = end
+            yield item
+        buffer = buffer[pos:]
+
+    if not finished:
+        raise ValueError("Incomplete json array")
@@ -0,0 +1,164 @@
+import time
+import asyncio
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from loguru import logger
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+from ..tg_handler.message import RENDERED, get_render_hash
+from ..tg_handler.send_queue import Priority
+
+from ..config.queue import (
+    WATCH_MIN_INTERVAL,
+    WATCH_MAX_INTERVAL,
+    WATCH_TIMEOUT,
+    WATCH_MAX_RECORDS,
+)
+
+
+@dataclass
+class QueueWatch:
+    chat_id: int
+    message_id: int
+    page: int
+    last_active: float
+
+
+@dataclass
+class QueuePollerStats:
+    watchers: int = 0
+    polls: int = 0
+    edits: int = 0
+    unchanged: int = 0
+    interval: float = WATCH_MIN_INTERVAL
+
+
+class QueuePoller:
+    """
+    Keeps live queue messages up to date.
+    A single poller per service fetches the queue once per interval, independent of
+    the number of watching chats. A message is only edited if its rendered page
+    changed. The interval grows while the queue does not change.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.watches: Dict[Tuple[int, int], QueueWatch] = {}
+        self.items: Optional[Dict[str, Any]] = None
+        self.task = None
+        self.bot = None
+        self.woken = asyncio.Event()
+        self.stats = QueuePollerStats()
+
+    def watch(self, application, chat_id, message_id, page=0, items=None):
+        self.bot = application.bot
+        if items:
+            self.items = items
+        self.watches[(chat_id, message_id)] = QueueWatch(
+            chat_id=chat_id, message_id=message_id, page=page, last_active=time.monotonic()
+        )
+        self.stats.watchers = len(self.watches)
+        self.stats.interval = WATCH_MIN_INTERVAL
+        if not self.task or self.task.done():
+            self.task = application.create_task(self.run())
+
+    def unwatch(self, chat_id, message_id):
+        self.watches.pop((chat_id, message_id), None)
+        self.stats.watchers = len(self.watches)
+
+    def wake(self):
+        # Poll right away, e.g. after the arr reported a queue change
+        self.woken.set()
+
+    def get(self, chat_id, message_id) -> Optional[QueueWatch]:
+        return self.watches.get((chat_id, message_id))
+
+    def touch(self, chat_id, message_id, page):
+        watch = self.get(chat_id, message_id)
+        if watch:
+            watch.page = page
+            watch.last_active = time.monotonic()
+        return watch
+
+    def get_page(self, page, page_size):
+        records = self.items.get("records", []) if self.items else []
+        return {
+            "totalRecords": len(records),
+            "records": records[page * page_size : (page + 1) * page_size],
+        }
+
+    async def poll(self):
+        items = await self.service.request(
+            "queue", params={"page": 1, "pageSize": WATCH_MAX_RECORDS}, fallback=None
+        )
+        self.stats.polls += 1
+        changed = items != self.items
+        if items is not None:
+            self.items = items
+        return changed
+
+    async def update(self, watch: QueueWatch):
+        response = self.service.render_queue_watch(watch.page, self)
+        render_hash = get_render_hash(response)
+        if RENDERED.is_unchanged(watch.chat_id, watch.message_id, render_hash):
+            self.stats.unchanged += 1
+            return
+        try:
+            await self.bot.edit_message_text(
+                response.caption,
+                chat_id=watch.chat_id,
+                message_id=watch.message_id,
+                reply_markup=response.reply_markup,
+                parse_mode=response.parse_mode,
+                rate_limit_args={"priority": Priority.LIVE},
+            )
+            self.stats.edits += 1
+        except BadRequest as e:
+            if "not modified" not in e.message:
+                logger.debug(f"Stopped watching queue message: {e.message}")
+                self.unwatch(watch.chat_id, watch.message_id)
+                return
+        except Forbidden as e:
+            # The bot was blocked or removed from the chat
+            logger.debug(f"Stopped watching queue message: {e.message}")
+            self.unwatch(watch.chat_id, watch.message_id)
+            return
+        except TelegramError as e:
+            # Possibly temporary (timeouts, network errors), retried on the next poll
+            logger.warning(f"Could not update queue message: {e!r}")
+            return
+        RENDERED.set(watch.chat_id, watch.message_id, render_hash, False)
+
+    async def run(self):
+        interval = WATCH_MIN_INTERVAL
+        while self.watches:
+            try:
+                await asyncio.wait_for(self.woken.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self.woken.clear()
+            now = time.monotonic()
+            for watch in list(self.watches.values()):
+                if now - watch.last_active > WATCH_TIMEOUT:
+                    self.unwatch(watch.chat_id, watch.message_id)
+
+            try:
+                changed = await self.poll()
+            except Exception as e:
+                logger.warning(f"Polling the queue failed: {e!r}")
+                changed = False
+
+            # Back off while nothing changes, poll quickly again once it does
+            if changed:
+                interval = WATCH_MIN_INTERVAL
+            else:
+                interval = min(interval * 1.5, WATCH_MAX_INTERVAL)
+            self.stats.interval = round(interval, 1)
+
+            for watch in list(self.watches.values()):
+                # A failing message must not stop the updates of the others
+                try:
+                    await self.update(watch)
+                except Exception as e:
+                    logger.warning(f"Updating a queue message failed: {e!r}")
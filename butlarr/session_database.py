@@ -1,4 +1,5 @@
 import os
+import time
 import pickle
 import re
 
@@ -51,3 +52,11 @@ class SessionDatabase:
             file_path = os.path.join(self.base_path, file)
             logger.debug(f"Deleting {file}")
             os.remove(file_path)
+
+    def clear_expired_sessions(self, max_age):
+        expired_before = time.time() - max_age
+        for file in os.listdir(self.base_path):
+            file_path = os.path.join(self.base_path, file)
+            if os.path.getmtime(file_path) < expired_before:
+                logger.debug(f"Deleting expired session {file}")
+                os.remove(file_path)
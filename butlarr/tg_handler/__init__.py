@@ -1,7 +1,7 @@
 import shlex
 import inspect
 
-from typing import List, Tuple, Callable
+from typing import Dict, List, Tuple, Callable
 from loguru import logger
 from functools import wraps
 from telegram.ext import CommandHandler, CallbackQueryHandler
@@ -10,30 +10,8 @@ from typing import TypeAlias
 from ..config.commands import AUTH_COMMAND, HELP_COMMAND, START_COMMAND
 from ..config.secrets import ADMIN_AUTH_PASSWORD
 from ..database import Database
-
-
-def escape_markdownv2_chars(text: str):
-    for c in [
-        "_",
-        "*",
-        "[",
-        "]",
-        "(",
-        ")",
-        "~",
-        "`",
-        "#",
-        "+",
-        "-",
-        "=",
-        "|",
-        "{",
-        "}",
-        ".",
-        "!",
-    ]:
-        text = text.replace(c, rf"\{c}")
-    return text
+from .callback_data import CALLBACK_CODEC
+from .markdown import escape_markdownv2_chars
 
 
 CmdStr: TypeAlias = str  # The command itself
@@ -73,15 +51,27 @@ def get_common_handlers(services):
 
 
 def get_clbk_handler(services):
+    # Callbacks are prefixed with the first command of their service
+    services_by_prefix = {}
+    for s in services:
+        if s.commands[0] in services_by_prefix:
+            logger.warning(f"Callback prefix {s.commands[0]} is used more than once")
+        services_by_prefix.setdefault(s.commands[0], s)
+
     async def handler(update, context):
-        args = shlex.split(update.callback_query.data.strip())
-        if args[0] == "noop":
+        if update.callback_query.data == "noop":
             await update.callback_query.answer()
             return
+        args = CALLBACK_CODEC.decode(update.callback_query.data)
+        if not args:
+            await update.callback_query.answer(
+                "This button has expired, please run the command again."
+            )
+            return
         logger.debug(f"Received callback: {args}")
-        for s in services:
-            if args[0] == s.commands[0]:
-                return await s.handle_callback(update, context)
+        service = services_by_prefix.get(args[0])
+        if service:
+            return await service.handle_callback(update, context, args)
         logger.error("Found no matching callback handler!")
 
     return CallbackQueryHandler(handler)
@@ -126,6 +116,9 @@ def command(
 def handler(cls):
     cls.sub_commands = []
     cls.sub_callbacks = []
+    # Dispatch tables, the first registration of a (sub)command wins
+    cls.command_table = {}
+    cls.callback_table = {}
     cls.default_command = None
     cls.default_callback = None
     cls.default_description = ""
@@ -138,6 +131,8 @@ def handler(cls):
             cls.sub_commands += [
                 (cmd, pattern, desc, method) for (cmd, pattern, desc) in method.cmd_cmds
             ]
+            for cmd, _, _ in method.cmd_cmds:
+                cls.command_table.setdefault(cmd, method)
         if hasattr(method, "cmd_default"):
             assert not has_default_command, f"Only one default command allowed."
             cls.default_command = method
@@ -147,6 +142,8 @@ def handler(cls):
             has_default_command = True
         if hasattr(method, "clbk_cmds"):
             cls.sub_callbacks += [(cmd, method) for cmd in method.clbk_cmds]
+            for cmd in method.clbk_cmds:
+                cls.callback_table.setdefault(cmd, method)
         if hasattr(method, "clbk_default"):
             assert not has_default_callback, "Only one default callback allowed."
             cls.default_callback = method
@@ -160,9 +157,12 @@ class TelegramHandler:
     commands: List[CmdStr]
     sub_commands: List[Tuple[CmdStr, CmdPattern, CmdDescription, Callable]]
     sub_callbacks: List[Tuple[str, Callable]]
+    command_table: Dict[str, Callable]
+    callback_table: Dict[str, Callable]
 
     def register(self, application, db):
         self.db = db
+        CALLBACK_CODEC.register(self)
         for cmd in self.commands:
             application.add_handler(CommandHandler(cmd, self.handle_command))
 
@@ -174,13 +174,12 @@ class TelegramHandler:
         args = shlex.split(update.message.text.strip())
         logger.info(f"Received command: {args}")
 
-        if self.sub_commands and len(args) > 1:
-            for s, _, _, c in self.sub_commands:
-                if args[1] == s:
-                    logger.debug(f"Subcommand - Executing {s} ({c.__name__})")
-                    await c(self, update, context, args[1:])
-                    return
-
+        c = self.command_table.get(args[1]) if len(args) > 1 else None
+        if c:
+            logger.debug(f"Subcommand - Executing {args[1]} ({c.__name__})")
+            await c(self, update, context, args[1:])
+            return
+        if len(args) > 1:
             logger.debug("No matching subcommand registered. Trying fallback")
         try:
             await self.default_command(update, context, args[1:])
@@ -191,23 +190,27 @@ class TelegramHandler:
         del _update, _context, _args
         raise NotImplementedError
 
-    async def handle_callback(self, update, context):
-        args = shlex.split(update.callback_query.data.strip())
-        if args[0] != self.commands[0]:
+    async def handle_callback(self, update, context, args=None):
+        # The args might already be parsed by the callback handler
+        if args is None:
+            args = CALLBACK_CODEC.decode(update.callback_query.data)
+        if not args or args[0] != self.commands[0]:
             return
-        if self.sub_callbacks and len(args) > 1:
-            for s, c in self.sub_callbacks:
-                if args[1] == s:
-                    logger.debug(f"Subcallback - Executing {s} ({c.__name__})")
-                    await c(self, update, context, args[1:])
-                    return
-
+        c = self.callback_table.get(args[1]) if len(args) > 1 else None
+        if c:
+            logger.debug(f"Subcallback - Executing {args[1]} ({c.__name__})")
+            await c(self, update, context, args[1:])
+            return
+        if len(args) > 1:
             logger.debug("No matching subcallback registered. Trying fallback")
         try:
             await self.default_callback(update, context, args[1:])
         except NotImplementedError:
             logger.error("No default callback handler registered.")
 
+    async def inline_search(self, term: str):
+        # Results for inline queries (`@bot <term>`), none by default
+        return []
+
     def get_clbk(self, *args: List[str]):
-        args = [self.commands[0], *args]
-        return (" ").join([f'"{arg}"' for arg in args])
+        return CALLBACK_CODEC.encode([self.commands[0], *args])
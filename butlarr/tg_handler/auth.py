@@ -23,13 +23,19 @@ class AuthLevels(Enum):
     ADMIN = 3
 
 
-def get_auth_level_from_message(db, update):
+def get_auth_level_from_message(db, update, context=None):
+    # Resolved once per update and attached to its context, later calls reuse it
+    if context is not None and hasattr(context, "auth_level"):
+        return context.auth_level
     uid = (
         update.message.from_user.id
         if update.message
         else update.callback_query.from_user.id
     )
-    return db.get_auth_level(uid)
+    auth_level = db.get_auth_level(uid)
+    if context is not None:
+        context.auth_level = auth_level
+    return auth_level
 
 
 def authorized(min_auth_level=None):
@@ -43,12 +49,8 @@ def authorized(min_auth_level=None):
         async def wrapped_func(*args, **kwargs):
             # Ensure user is authorized
             update = args[1] if len(args) >= 2 else kwargs["update"]
-            uid = (
-                update.message.from_user.id
-                if update.message
-                else update.callback_query.from_user.id
-            )
-            auth_level = args[0].db.get_auth_level(uid)
+            context = args[2] if len(args) >= 3 else kwargs.get("context")
+            auth_level = get_auth_level_from_message(args[0].db, update, context)
             # TODO pjordan: Reenable this some time
             if not auth_level or min_auth_level > auth_level and False:
                 await update.message.reply_text(
@@ -0,0 +1,192 @@
+import shlex
+import zlib
+import base64
+import secrets
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Telegram limits callback data to 64 bytes
+MAX_CALLBACK_DATA = 64
+MAX_TOKENS = 10000
+
+BINARY_MARKER = "~"
+TOKEN_MARKER = "!"
+# Opcode of subcallbacks not in the table, their name follows as first arg
+NAMED_OPCODE = 0xFF
+
+
+def parse_clbk(data: str) -> List[str]:
+    data = data.strip()
+    # Fast path for the quoted args created by get_clbk, without escapes or quotes
+    if data.startswith('"') and data.endswith('"') and "\\" not in data:
+        args = data[1:-1].split('" "')
+        if data.count('"') == 2 * len(args):
+            return args
+    return shlex.split(data)
+
+
+def quote_clbk(args: List[Any]) -> str:
+    return (" ").join([f'"{arg}"' for arg in args])
+
+
+def write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return (result, pos)
+        shift += 7
+
+
+def encode_arg(out: bytearray, arg: str):
+    # Canonical non-negative integers are stored as numbers, everything else as text
+    if arg.isdigit() and arg.isascii() and (arg == "0" or arg[0] != "0"):
+        write_varint(out, int(arg) << 1)
+    else:
+        raw = arg.encode()
+        write_varint(out, (len(raw) << 1) | 1)
+        out += raw
+
+
+@dataclass
+class ServiceCodes:
+    index: int
+    schema: int
+    opcodes: Dict[str, int]
+    names: List[str]
+
+
+@dataclass
+class CallbackCodecStats:
+    encoded: int = 0
+    tokens: int = 0
+    legacy: int = 0
+    expired: int = 0
+
+
+class CallbackCodec:
+    """
+    Encodes callback args compactly: the service and subcallback become single
+    bytes (opcodes), the args varints or length prefixed text, base64 encoded.
+    Payloads exceeding telegrams limit are stored on the server behind a short token.
+    Every service also stores a checksum of its callbacks, so buttons created
+    before the callbacks changed are rejected instead of being misinterpreted.
+    The quoted format of older buttons can still be decoded.
+    """
+
+    def __init__(self, max_tokens=MAX_TOKENS):
+        self.services: Dict[str, ServiceCodes] = {}
+        self.prefixes: List[str] = []
+        self.tokens: OrderedDict[str, List[str]] = OrderedDict()
+        # Identical payloads share their token, e.g. when a keyboard is rendered again
+        self.tokens_by_args: Dict[Tuple[str, ...], str] = {}
+        self.max_tokens = max_tokens
+        self.stats = CallbackCodecStats()
+
+    def register(self, service):
+        prefix = service.commands[0]
+        # The service index is stored in a single byte
+        if prefix in self.services or len(self.prefixes) > 0xFF:
+            return
+        names = sorted(service.callback_table)[:NAMED_OPCODE]
+        schema = zlib.crc32("\0".join([prefix, *names]).encode()) & 0xFF
+        self.services[prefix] = ServiceCodes(
+            index=len(self.prefixes),
+            schema=schema,
+            opcodes={name: i for i, name in enumerate(names)},
+            names=names,
+        )
+        self.prefixes.append(prefix)
+
+    def encode(self, args: List[Any]) -> str:
+        args = [str(arg) for arg in args]
+        codes = self.services.get(args[0])
+        if not codes or len(args) < 2:
+            return quote_clbk(args)
+
+        out = bytearray((codes.index, codes.schema))
+        opcode = codes.opcodes.get(args[1])
+        if opcode is None:
+            out.append(NAMED_OPCODE)
+            encode_arg(out, args[1])
+        else:
+            out.append(opcode)
+        for arg in args[2:]:
+            encode_arg(out, arg)
+
+        data = BINARY_MARKER + base64.urlsafe_b64encode(out).decode().rstrip("=")
+        if len(data) <= MAX_CALLBACK_DATA:
+            self.stats.encoded += 1
+            return data
+        return self.set_token(args)
+
+    def set_token(self, args: List[str]) -> str:
+        key = tuple(args)
+        token = self.tokens_by_args.get(key)
+        if token:
+            self.tokens.move_to_end(token)
+            return TOKEN_MARKER + token
+
+        token = secrets.token_urlsafe(6)
+        self.tokens[token] = args
+        self.tokens_by_args[key] = token
+        while len(self.tokens) > self.max_tokens:
+            (_, evicted) = self.tokens.popitem(last=False)
+            self.tokens_by_args.pop(tuple(evicted), None)
+        self.stats.tokens += 1
+        return TOKEN_MARKER + token
+
+    def decode_binary(self, data: str) -> List[str]:
+        raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+        prefix = self.prefixes[raw[0]]
+        codes = self.services[prefix]
+        if raw[1] != codes.schema:
+            raise ValueError("Callbacks changed since the button was created")
+
+        args = [prefix]
+        pos = 3
+        if raw[2] != NAMED_OPCODE:
+            args.append(codes.names[raw[2]])
+        while pos < len(raw):
+            (value, pos) = read_varint(raw, pos)
+            if value & 1:
+                end = pos + (value >> 1)
+                args.append(raw[pos:end].decode())
+                pos = end
+            else:
+                args.append(str(value >> 1))
+        return args
+
+    def decode(self, data: str) -> Optional[List[str]]:
+        """
+        Returns the args of the callback data, or None if the button expired.
+        """
+        try:
+            if data.startswith(BINARY_MARKER):
+                return self.decode_binary(data[1:])
+            if data.startswith(TOKEN_MARKER):
+                args = self.tokens.get(data[1:])
+                if args is None:
+                    self.stats.expired += 1
+                    return None
+                return list(args)
+            self.stats.legacy += 1
+            return parse_clbk(data)
+        except Exception:
+            self.stats.expired += 1
+            return None
+
+
+CALLBACK_CODEC = CallbackCodec()
@@ -0,0 +1,93 @@
+import asyncio
+
+from itertools import chain, zip_longest
+from dataclasses import dataclass
+from typing import Dict
+from loguru import logger
+from telegram import InlineQueryResultsButton
+from telegram.ext import InlineQueryHandler
+
+from ..database import Database
+
+# Wait for the user to stop typing, before looking up a query
+INLINE_DEBOUNCE = 0.4
+# Telegram serves repeated queries itself for this many seconds
+INLINE_CACHE_TIME = 300
+INLINE_MAX_RESULTS = 20
+
+
+@dataclass
+class InlineSearchStats:
+    queries: int = 0
+    answered: int = 0
+    cancelled: int = 0
+
+
+class InlineSearch:
+    """
+    Answers inline queries (`@bot dune`) with lookup results of the services.
+    A query can be limited to one service by starting it with one of its commands.
+    Queries are debounced per user and a newer query cancels the older one.
+    """
+
+    def __init__(self, services, db: Database):
+        self.services = services
+        self.db = db
+        self.services_by_cmd = {cmd: s for s in services for cmd in s.commands}
+        self.pending: Dict[int, asyncio.Task] = {}
+        self.stats = InlineSearchStats()
+
+    async def search(self, text: str):
+        (cmd, _, term) = text.strip().partition(" ")
+        if cmd in self.services_by_cmd:
+            services = [self.services_by_cmd[cmd]]
+        else:
+            services = self.services
+            term = text.strip()
+        if not term:
+            return []
+
+        results = await asyncio.gather(*[s.inline_search(term) for s in services])
+        # Interleave the results of the services
+        merged = chain.from_iterable(zip_longest(*results))
+        return [r for r in merged if r][:INLINE_MAX_RESULTS]
+
+    async def handle(self, update, context):
+        query = update.inline_query
+        user_id = query.from_user.id
+        self.stats.queries += 1
+        if not self.db.get_auth_level(user_id):
+            await query.answer(
+                [],
+                is_personal=True,
+                button=InlineQueryResultsButton(
+                    text="Authorize to search", start_parameter="auth"
+                ),
+            )
+            return
+
+        previous = self.pending.get(user_id)
+        if previous:
+            previous.cancel()
+        task = asyncio.current_task()
+        self.pending[user_id] = task
+        try:
+            await asyncio.sleep(INLINE_DEBOUNCE)
+            results = await self.search(query.query)
+            await query.answer(
+                results, cache_time=INLINE_CACHE_TIME, is_personal=True
+            )
+            self.stats.answered += 1
+        except asyncio.CancelledError:
+            # Superseded by a newer query of the same user
+            self.stats.cancelled += 1
+            logger.debug(f"Cancelled inline query [{query.query}]")
+        finally:
+            if self.pending.get(user_id) is task:
+                del self.pending[user_id]
+
+
+def get_inline_handler(services, db: Database):
+    search = InlineSearch(services, db)
+    # Not blocking, so a debounced query does not hold back other updates
+    return InlineQueryHandler(search.handle, block=False)
@@ -1,4 +1,6 @@
+import time
 import shlex
+import inspect
 
 from typing import List, Tuple, Callable, Optional
 from loguru import logger
@@ -11,6 +13,7 @@ from dataclasses import dataclass
 from typing import Any, List, Optional
 
 from ..database import Database
+from .render_cache import RENDER_CACHE
 
 
 @dataclass(frozen=True)
@@ -20,7 +23,19 @@ class Button:
     url: Optional[str] = None
 
 
-def keyboard(func):
+def keyboard(func=None, *, key=None):
+    """
+    Turns the returned button rows into an InlineKeyboardMarkup.
+    With a key function (called with the same args) the markup is cached by its key,
+    a key of None renders the keyboard without caching it.
+    """
+    if func is None:
+        return lambda func: keyboard(func, key=key)
+
+    def get_key(args, kwargs):
+        cache_key = key(*args, **kwargs) if key else None
+        return (func.__qualname__, cache_key) if cache_key is not None else None
+
     def create_keyboard(buttons: List[List[Optional[Button]]]):
         keyboard = [
             [
@@ -38,9 +53,26 @@ def keyboard(func):
         keyboard_markup = InlineKeyboardMarkup(keyboard)
         return keyboard_markup
 
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def wrapped_async_func(*args, **kwargs):
+            cache_key = get_key(args, kwargs)
+            cached = RENDER_CACHE.get(cache_key)
+            if cached is not None:
+                return cached
+            started = time.perf_counter()
+            buttons = await func(*args, **kwargs)
+            keyboard_markup = create_keyboard(buttons)
+            RENDER_CACHE.set(cache_key, keyboard_markup, started)
+            return keyboard_markup
+
+        return wrapped_async_func
+
     @wraps(func)
     def wrapped_func(*args, **kwargs):
-        buttons = func(*args, **kwargs)
-        return create_keyboard(buttons)
+        return RENDER_CACHE.render(
+            get_key(args, kwargs), lambda: create_keyboard(func(*args, **kwargs))
+        )
 
     return wrapped_func
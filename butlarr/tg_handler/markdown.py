@@ -0,0 +1,10 @@
+MARKDOWNV2_CHARS = frozenset("_*[]()~`#+-=|{}.!")
+MARKDOWNV2_ESCAPES = {c: rf"\{c}" for c in MARKDOWNV2_CHARS}
+
+
+def escape_markdownv2_chars(text: str):
+    # Only replaces the special characters present in the text, on CPython this is
+    # faster than both a replace per special character and str.translate
+    for c in MARKDOWNV2_CHARS.intersection(text):
+        text = text.replace(c, MARKDOWNV2_ESCAPES[c])
+    return text
@@ -1,16 +1,19 @@
 import shlex
 
+from collections import OrderedDict
+
 from typing import List, Tuple, Callable, Optional, Literal
 from loguru import logger
 from functools import wraps
 from telegram.ext import CommandHandler, CallbackQueryHandler
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.error import BadRequest
 
 from dataclasses import dataclass
 from typing import Any
 
 from ..database import Database
+from .posters import POSTERS, FALLBACK_POSTER
 
 bad_request_poster_error_messages = [
     "Wrong type of the web page content",
@@ -35,10 +38,171 @@ class Response:
     ] = None
 
 
+class ResponseError(Exception):
+    # Raise from a handler to abort it and reply with the given response instead
+    def __init__(self, response: Response):
+        super().__init__(response.caption)
+        self.response = response
+
+
+def get_render_hash(response: Response):
+    markup = response.reply_markup.to_json() if response.reply_markup else ""
+    return hash((response.photo, response.caption, markup, response.parse_mode))
+
+
+class RenderedMessages:
+    """
+    Remembers the render hash and type (media or text) of recently sent messages,
+    so identical edits can be skipped and the right edit method is used directly.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.messages: OrderedDict[Tuple[int, int], Tuple[int, bool]] = OrderedDict()
+        self.skipped = 0
+
+    def get(self, chat_id, message_id) -> Optional[Tuple[int, bool]]:
+        return self.messages.get((chat_id, message_id))
+
+    def is_unchanged(self, chat_id, message_id, render_hash):
+        entry = self.get(chat_id, message_id)
+        if entry and entry[0] == render_hash:
+            self.skipped += 1
+            return True
+        return False
+
+    def set(self, chat_id, message_id, render_hash, is_media):
+        self.messages[(chat_id, message_id)] = (render_hash, is_media)
+        self.messages.move_to_end((chat_id, message_id))
+        while len(self.messages) > self.max_size:
+            self.messages.popitem(last=False)
+
+
+RENDERED = RenderedMessages()
+
+
+def is_media_message(message):
+    entry = RENDERED.get(message.chat_id, message.message_id)
+    if entry:
+        return entry[1]
+    return bool(message.photo) or message.caption is not None
+
+
+async def edit_message(callback_query, message: Response):
+    original = callback_query.message
+    render_hash = get_render_hash(message)
+    if RENDERED.is_unchanged(original.chat_id, original.message_id, render_hash):
+        return
+
+    is_media = is_media_message(original)
+    try:
+        if is_media:
+            await callback_query.edit_message_caption(
+                reply_markup=message.reply_markup,
+                caption=message.caption,
+                parse_mode=message.parse_mode,
+            )
+        else:
+            await callback_query.edit_message_text(
+                message.caption,
+                reply_markup=message.reply_markup,
+                parse_mode=message.parse_mode,
+            )
+    except BadRequest as e:
+        if e.message in no_caption_error_messages:
+            is_media = False
+            await callback_query.edit_message_text(
+                message.caption,
+                reply_markup=message.reply_markup,
+                parse_mode=message.parse_mode,
+            )
+        elif e.message not in no_edit_error_messages:
+            raise e
+    RENDERED.set(original.chat_id, original.message_id, render_hash, is_media)
+
+
+async def send_photo(bot, chat_id, url, message: Response):
+    photo = await POSTERS.get_photo(url)
+    if photo is None:
+        return None
+    sent = await bot.send_photo(
+        chat_id=chat_id,
+        photo=photo,
+        caption=message.caption,
+        reply_markup=message.reply_markup,
+    )
+    POSTERS.set(url, sent)
+    return sent
+
+
+async def edit_photo(callback_query, url, message: Response):
+    photo = await POSTERS.get_photo(url)
+    if photo is None:
+        return None
+    edited = await callback_query.edit_message_media(
+        InputMediaPhoto(photo, caption=message.caption, parse_mode=message.parse_mode),
+        reply_markup=message.reply_markup,
+    )
+    POSTERS.set(url, edited)
+    return edited
+
+
+async def with_fallback_poster(send, url):
+    # Sends the poster at url, falling back to the default poster if that fails
+    try:
+        sent = await send(url)
+        error = "Could not fetch poster"
+    except BadRequest as e:
+        if str(e) not in bad_request_poster_error_messages:
+            raise e
+        sent = None
+        error = f"BadRequest: {e}"
+    if sent:
+        return sent
+
+    logger.error(
+        f"Error sending photo [{url}]: {error}. Attempting to send with default poster..."
+    )
+    POSTERS.set_failed(url)
+    return await send(FALLBACK_POSTER)
+
+
+async def send_poster(bot, chat_id, message: Response):
+    return await with_fallback_poster(
+        lambda url: send_photo(bot, chat_id, url, message),
+        POSTERS.get_url(message.photo),
+    )
+
+
+async def edit_poster(callback_query, message: Response):
+    # Replaces the poster and caption of a media message in place
+    # Returns None if the message can not be edited
+    original = callback_query.message
+    if not is_media_message(original):
+        return None
+    if RENDERED.is_unchanged(
+        original.chat_id, original.message_id, get_render_hash(message)
+    ):
+        return original
+    try:
+        return await with_fallback_poster(
+            lambda url: edit_photo(callback_query, url, message),
+            POSTERS.get_url(message.photo),
+        )
+    except BadRequest as e:
+        if e.message in no_edit_error_messages:
+            return original
+        logger.debug(f"Could not edit message media: {e.message}")
+        return None
+
+
 def clear(func):
     @wraps(func)
     async def wrapped_func(self, update, context, *args, **kwargs):
-        message = await func(self, update, context, *args, **kwargs)
+        try:
+            message = await func(self, update, context, *args, **kwargs)
+        except ResponseError as e:
+            message = e.response
 
         if update.callback_query:
             await update.callback_query.message.reply_text(message.caption)
@@ -52,7 +216,10 @@ def clear(func):
 def repaint(func):
     @wraps(func)
     async def wrapped_func(self, update, context, *args, **kwargs):
-        message = await func(self, update, context, *args, **kwargs)
+        try:
+            message = await func(self, update, context, *args, **kwargs)
+        except ResponseError as e:
+            message = e.response
 
         if not message:
             return
@@ -60,67 +227,29 @@ def repaint(func):
         if not message.photo:
             if update.callback_query:
                 await update.callback_query.answer()
-                try:
-                    await update.callback_query.edit_message_caption(
-                        reply_markup=message.reply_markup,
-                        caption=message.caption,
-                        parse_mode=message.parse_mode,
-                    )
-                except BadRequest as e:
-                    if e.message in no_caption_error_messages:
-                        try:
-                            await update.callback_query.edit_message_text(
-                                message.caption,
-                                reply_markup=message.reply_markup,
-                                parse_mode=message.parse_mode,
-                            )
-                        except BadRequest as e2:
-                            if e.message in no_edit_error_messages:
-                                pass
-                            else:
-                                raise e2
-                    elif e.message in no_edit_error_messages:
-                        pass
-                    else:
-                        raise e
+                await edit_message(update.callback_query, message)
             else:
-                await update.message.reply_text(
+                sent = await update.message.reply_text(
                     message.caption,
                     reply_markup=message.reply_markup,
                     parse_mode=message.parse_mode,
                 )
-        else:
-            try:
-                await context.bot.send_photo(
-                    chat_id=(
-                        update.message.chat.id
-                        if update.message
-                        else update.callback_query.message.chat.id
-                    ),
-                    photo=message.photo,
-                    caption=message.caption,
-                    reply_markup=message.reply_markup,
+                RENDERED.set(
+                    sent.chat_id, sent.message_id, get_render_hash(message), False
                 )
-            except BadRequest as e:
-                if str(e) in bad_request_poster_error_messages:
-                    logger.error(
-                        f"Error sending photo [{message.photo}]: BadRequest: {e}. Attempting to send with default poster..."
-                    )
-                    await context.bot.send_photo(
-                        chat_id=(
-                            update.message.chat.id
-                            if update.message
-                            else update.callback_query.message.chat.id
-                        ),
-                        photo="https://artworks.thetvdb.com/banners/images/missing/movie.jpg",
-                        caption=message.caption,
-                        reply_markup=message.reply_markup,
-                    )
-                else:
-                    raise e
-            finally:
-                if update.callback_query:
-                    await update.callback_query.answer()
-                    await update.callback_query.message.delete()
+        else:
+            query = update.callback_query
+            if query:
+                await query.answer()
+            # Navigating replaces the poster in place, instead of send and delete
+            sent = await edit_poster(query, message) if query else None
+            if not sent:
+                chat_id = query.message.chat.id if query else update.message.chat.id
+                try:
+                    sent = await send_poster(context.bot, chat_id, message)
+                finally:
+                    if query:
+                        await query.message.delete()
+            RENDERED.set(sent.chat_id, sent.message_id, get_render_hash(message), True)
 
     return wrapped_func
@@ -0,0 +1,102 @@
+import time
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+FALLBACK_POSTER = "https://artworks.thetvdb.com/banners/images/missing/movie.jpg"
+# Failed urls are retried after this many seconds
+FAILED_POSTER_TTL = 24 * 60 * 60
+
+
+@dataclass
+class PosterCacheStats:
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+    skipped_failed: int = 0
+
+
+class PosterCache:
+    """
+    Maps poster urls to the telegram file_id of the first successful send, so
+    telegram only fetches a poster once. Urls telegram failed to fetch are
+    remembered to directly send the fallback poster instead.
+    Entries are persisted in the database, once one is attached with `load`.
+    If a fetcher is set, posters are fetched locally and uploaded instead.
+    """
+
+    def __init__(self):
+        self.file_ids: Dict[str, str] = {}
+        self.failed: Dict[str, float] = {}
+        self.db = None
+        self.fetcher = None
+        self.stats = PosterCacheStats()
+
+    def load(self, db):
+        self.db = db
+        for record in db.get_posters():
+            if record["file_id"]:
+                self.file_ids[record["url"]] = record["file_id"]
+            elif record["failed_at"]:
+                self.failed[record["url"]] = record["failed_at"]
+        self.stats.size = len(self.file_ids)
+        logger.debug(f"Loaded {len(self.file_ids)} cached posters")
+
+    def is_failed(self, url):
+        failed_at = self.failed.get(url)
+        return failed_at is not None and time.time() - failed_at < FAILED_POSTER_TTL
+
+    def get_url(self, url: str) -> str:
+        # The url to send, known failing urls are replaced by the fallback
+        if url != FALLBACK_POSTER and self.is_failed(url):
+            self.stats.skipped_failed += 1
+            return FALLBACK_POSTER
+        return url
+
+    async def get_photo(self, url: str) -> Optional[Any]:
+        """
+        Returns what to send for a url: its cached file_id, the locally fetched
+        poster or the url itself. None if the poster could not be fetched.
+        """
+        file_id = self.file_ids.get(url)
+        if file_id:
+            self.stats.hits += 1
+            return file_id
+        self.stats.misses += 1
+        if self.fetcher and url != FALLBACK_POSTER:
+            return await self.fetcher.get(url)
+        return url
+
+    def prefetch(self, urls: List[str]):
+        if not self.fetcher:
+            return
+        for url in urls:
+            if url and url not in self.file_ids and not self.is_failed(url):
+                self.fetcher.prefetch(url)
+
+    def set(self, url: str, sent_message):
+        if not url or url in self.file_ids or not sent_message.photo:
+            return
+        # The largest size is the original upload, reuse it for later sends
+        file_id = sent_message.photo[-1].file_id
+        self.file_ids[url] = file_id
+        self.failed.pop(url, None)
+        self.stats.size = len(self.file_ids)
+        if self.db:
+            self.db.set_poster(url, file_id=file_id)
+
+    def set_failed(self, url: str):
+        if url in self.file_ids:
+            # A cached file_id became invalid, fetch the url again next time
+            del self.file_ids[url]
+            self.stats.size = len(self.file_ids)
+            if self.db:
+                self.db.remove_poster(url)
+            return
+        self.failed[url] = time.time()
+        if self.db:
+            self.db.set_poster(url, failed_at=self.failed[url])
+
+
+POSTERS = PosterCache()
@@ -0,0 +1,63 @@
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Optional
+
+RENDER_CACHE_SIZE = 1024
+
+
+@dataclass
+class RenderCacheStats:
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+    # Total milliseconds spent rendering the misses
+    render_ms: float = 0
+
+
+class RenderCache:
+    """
+    LRU cache of rendered keyboards and captions, keyed by every input affecting them.
+    Keys of service renders contain the services metadata version, so changed
+    root folders or profiles are rendered anew instead of being invalidated.
+    A max_size of 0 disables the cache, while still measuring render times.
+    """
+
+    def __init__(self, max_size=RENDER_CACHE_SIZE):
+        self.max_size = max_size
+        self.renders: OrderedDict[Hashable, Any] = OrderedDict()
+        self.stats = RenderCacheStats()
+
+    def get(self, key: Optional[Hashable]) -> Optional[Any]:
+        if key is None or key not in self.renders:
+            return None
+        self.renders.move_to_end(key)
+        self.stats.hits += 1
+        return self.renders[key]
+
+    def set(self, key: Optional[Hashable], value: Any, started: float):
+        self.stats.misses += 1
+        self.stats.render_ms += (time.perf_counter() - started) * 1000
+        if key is None or not self.max_size:
+            return
+        self.renders[key] = value
+        while len(self.renders) > self.max_size:
+            self.renders.popitem(last=False)
+        self.stats.size = len(self.renders)
+
+    def render(self, key: Optional[Hashable], render: Callable[[], Any]) -> Any:
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        value = render()
+        self.set(key, value, started)
+        return value
+
+    def clear(self):
+        self.renders.clear()
+        self.stats.size = 0
+
+
+RENDER_CACHE = RenderCache()
@@ -0,0 +1,208 @@
+import math
+import time
+import asyncio
+
+from enum import IntEnum
+from datetime import timedelta
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+# Telegram flood limits: ~30 messages per second overall, about one message per
+# second per private chat and 20 messages per minute per group
+OVERALL_RATE = 30
+OVERALL_BURST = 30
+CHAT_RATE = 1
+CHAT_BURST = 3
+GROUP_RATE = 20 / 60
+GROUP_BURST = 5
+# The message limits only apply to new messages, edits (and deletions) of a chat
+# get a looser budget of their own
+EDIT_RATE = 1
+EDIT_BURST = 5
+MAX_RETRIES = 2
+MAX_BUCKETS = 10000
+
+
+def is_send(endpoint: str):
+    return endpoint.startswith("send") or endpoint in ["forwardMessage", "copyMessage"]
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    LIVE = 1
+    NOTIFICATION = 2
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now) -> float:
+        # Seconds until a token is available
+        self.refill(now)
+        return max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    def take(self, now):
+        self.refill(now)
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def is_idle(self, now):
+        self.refill(now)
+        return self.tokens >= self.burst and self.paused_until <= now
+
+
+@dataclass(order=True)
+class QueuedSend:
+    priority: int
+    seq: int
+    bucket: Any = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+@dataclass
+class SendQueueStats:
+    depth: int = 0
+    max_depth: int = 0
+    sent: int = 0
+    delayed: int = 0
+    retries: int = 0
+
+
+class SendQueue(BaseRateLimiter[Dict[str, Any]]):
+    """
+    Schedules outbound requests to chats within Telegrams flood limits.
+    Requests wait for a token of the overall and the per chat bucket (new messages
+    and edits of a chat are limited separately) and are
+    released by priority (interactive replies before live updates before
+    notifications). A `RetryAfter` pauses the affected chat and retries the request.
+    The priority of a request can be set with `rate_limit_args={"priority": ...}`.
+    """
+
+    def __init__(self):
+        self.overall = TokenBucket(OVERALL_RATE, OVERALL_BURST)
+        self.buckets: Dict[Any, TokenBucket] = {}
+        self.pending: List[QueuedSend] = []
+        self.seq = 0
+        self.woken = asyncio.Event()
+        self.task = None
+        self.stats = SendQueueStats()
+
+    async def initialize(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def shutdown(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    def get_bucket(self, chat_id, send=True) -> TokenBucket:
+        bucket = self.buckets.get((chat_id, send))
+        if not bucket:
+            if len(self.buckets) >= MAX_BUCKETS:
+                now = time.monotonic()
+                self.buckets = {
+                    k: b for k, b in self.buckets.items() if not b.is_idle(now)
+                }
+            # Group and channel ids are negative
+            is_group = isinstance(chat_id, str) or int(chat_id) < 0
+            if not send:
+                bucket = TokenBucket(EDIT_RATE, EDIT_BURST)
+            elif is_group:
+                bucket = TokenBucket(GROUP_RATE, GROUP_BURST)
+            else:
+                bucket = TokenBucket(CHAT_RATE, CHAT_BURST)
+            self.buckets[(chat_id, send)] = bucket
+        return bucket
+
+    def get_stats(self):
+        self.stats.depth = len(self.pending)
+        return self.stats
+
+    async def acquire(self, bucket, priority):
+        future = asyncio.get_running_loop().create_future()
+        self.seq += 1
+        self.pending.append(QueuedSend(priority, self.seq, bucket, future))
+        self.stats.max_depth = max(self.stats.max_depth, len(self.pending))
+        self.woken.set()
+        started = time.monotonic()
+        await future
+        if time.monotonic() - started > 0.01:
+            self.stats.delayed += 1
+
+    def release_next(self, now) -> float:
+        # Releases the first ready request, otherwise returns the time to wait
+        delay = self.overall.delay(now)
+        if delay > 0:
+            return delay
+        delay = math.inf
+        for entry in sorted(self.pending):
+            if entry.future.done():
+                self.pending.remove(entry)
+                continue
+            bucket = entry.bucket
+            bucket_delay = bucket.delay(now)
+            if bucket_delay <= 0:
+                self.pending.remove(entry)
+                self.overall.take(now)
+                bucket.take(now)
+                entry.future.set_result(None)
+                return 0
+            delay = min(delay, bucket_delay)
+        return delay
+
+    async def run(self):
+        while True:
+            delay = self.release_next(time.monotonic()) if self.pending else math.inf
+            if delay <= 0:
+                continue
+            self.woken.clear()
+            try:
+                await asyncio.wait_for(
+                    self.woken.wait(), None if delay == math.inf else delay
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_request(
+        self, callback, args, kwargs, endpoint, data, rate_limit_args: Optional[Dict]
+    ):
+        chat_id = data.get("chat_id")
+        priority = (rate_limit_args or {}).get("priority", Priority.INTERACTIVE)
+        send = is_send(endpoint)
+        for attempt in range(MAX_RETRIES + 1):
+            if chat_id is not None and self.task:
+                await self.acquire(self.get_bucket(chat_id, send), priority)
+            try:
+                result = await callback(*args, **kwargs)
+                if chat_id is not None:
+                    self.stats.sent += 1
+                return result
+            except RetryAfter as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                logger.warning(f"Flood limit hit on {endpoint}, retry in {retry_after}s")
+                self.stats.retries += 1
+                if chat_id is not None:
+                    self.get_bucket(chat_id, send).pause(retry_after)
+                else:
+                    await asyncio.sleep(retry_after)
+
+
+SEND_QUEUE = SendQueue()
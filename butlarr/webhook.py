@@ -0,0 +1,167 @@
+import hmac
+import json
+import base64
+import asyncio
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit, parse_qs
+from loguru import logger
+
+
+MAX_BODY_SIZE = 1024 * 1024
+READ_TIMEOUT = 10
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+}
+
+
+@dataclass
+class WebhookStats:
+    received: int = 0
+    rejected: int = 0
+    failed: int = 0
+
+
+class WebhookServer:
+    """
+    Minimal embedded http server receiving the Radarr/Sonarr "Webhook" connection.
+    Events are posted to `/webhook/<command>`, where command is any of the
+    commands of the receiving service. The secret has to be passed as
+    `?token=<secret>` or as the basic auth password. Without a secret, the server
+    only listens on the loopback interface.
+    Events are acknowledged immediately and handled in the background.
+    """
+
+    def __init__(
+        self,
+        services: List[Any],
+        host: str = "127.0.0.1",
+        port: int = 8880,
+        secret: Optional[str] = None,
+    ):
+        self.services = {cmd: s for s in services for cmd in s.commands}
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.server = None
+        self.application = None
+        # Events are handled one at a time in the order they were received
+        self.lock = asyncio.Lock()
+        self.stats = WebhookStats()
+
+    def is_loopback(self):
+        return self.host in ["127.0.0.1", "::1", "localhost"]
+
+    async def start(self, application):
+        if not self.secret and not self.is_loopback():
+            # Anyone reaching the port could send notifications to all subscribers
+            logger.error(
+                f"Not listening for webhooks on {self.host}:{self.port} without a "
+                "secret. Configure a webhook secret or listen on 127.0.0.1 only."
+            )
+            return
+        if not self.secret:
+            logger.warning(
+                "Webhooks are accepted without a secret, only listening on "
+                f"{self.host}:{self.port}. Configure a secret to accept remote events."
+            )
+        self.application = application
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        logger.info(f"Listening for webhooks on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def is_authorized(self, headers: Dict[str, str], query: Dict[str, List[str]]):
+        if not self.secret:
+            return True
+        token = query.get("token", [""])[0]
+        auth = headers.get("authorization", "")
+        if auth.lower().startswith("basic "):
+            try:
+                credentials = base64.b64decode(auth[6:]).decode()
+                token = token or credentials.split(":", 1)[1]
+            except Exception:
+                pass
+        return hmac.compare_digest(token.encode(), self.secret.encode())
+
+    async def read_request(self, reader):
+        request_line = await reader.readline()
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, value = line.decode("latin-1").split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_SIZE:
+            return (method, target, headers, None)
+        body = await reader.readexactly(length) if length else b""
+        return (method, target, headers, body)
+
+    def dispatch(self, method, target, headers, body) -> int:
+        url = urlsplit(target)
+        parts = [p for p in url.path.split("/") if p]
+        if len(parts) != 2 or parts[0] != "webhook" or parts[1] not in self.services:
+            return 404
+        if method != "POST":
+            return 405
+        if not self.is_authorized(headers, parse_qs(url.query)):
+            return 401
+        if body is None:
+            return 413
+        try:
+            payload = json.loads(body)
+            assert isinstance(payload, dict)
+        except Exception:
+            return 400
+
+        service = self.services[parts[1]]
+        self.application.create_task(self.process(service, payload))
+        return 200
+
+    async def process(self, service, payload):
+        async with self.lock:
+            try:
+                await service.handle_webhook(payload, self.application)
+            except Exception as e:
+                self.stats.failed += 1
+                logger.error(
+                    f"Failed to handle {payload.get('eventType')} webhook: {e!r}"
+                )
+
+    async def handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(self.read_request(reader), READ_TIMEOUT)
+            status = self.dispatch(*request)
+        except Exception as e:
+            logger.debug(f"Received malformed webhook request: {e!r}")
+            status = 400
+
+        if status == 200:
+            self.stats.received += 1
+        else:
+            self.stats.rejected += 1
+        try:
+            writer.write(
+                (
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    "Content-Length: 0\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode()
+            )
+            await writer.drain()
+        finally:
+            writer.close()
@@ -0,0 +1,97 @@
+"""
+Measures how many "chats" can be served concurrently while the arr backend is slow.
+
+Compares a blocking client (how ArrService used to issue requests) against the
+async ArrService.request path. Every chat looks up a different term, so requests are
+not coalesced. Blocking requests run one after another (20 chats at 0.2s take
+~4.4s), async ones in waves of ClientConfig.max_connections (10 by default, so
+~0.46s for 20 chats and ~2.1s for 100). Run from the repository root:
+
+    python scripts/benchmarks/concurrent_requests.py [--chats 20] [--delay 0.2]
+"""
+
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+os.environ.setdefault("BUTLARR_CONFIG_FILE", "templates/config.yaml")
+
+from butlarr.services import ArrService  # noqa: E402
+
+
+def start_fake_arr(delay):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = json.dumps([{"title": "Dune", "year": 2021}]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        # The default backlog of 5 overflows with concurrent chats, delaying
+        # connections by SYN retries instead of the backend latency
+        request_queue_size = 128
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_blocking(api_url, chats):
+    async def chat(term):
+        # Mirrors the old requests.get call inside an async handler
+        return httpx.get(f"{api_url}/movie/lookup", params={"term": term}).json()
+
+    return await asyncio.gather(*[chat(f"dune {i}") for i in range(chats)])
+
+
+async def run_async(service, chats):
+    async def chat(term):
+        return await service.request("movie/lookup", params={"term": term})
+
+    # Every chat searches something else, identical requests would be coalesced
+    return await asyncio.gather(*[chat(f"dune {i}") for i in range(chats)])
+
+
+def measure(label, chats, coro):
+    start = time.perf_counter()
+    asyncio.run(coro)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {elapsed:8.3f}s  {chats / elapsed:8.1f} chats/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = start_fake_arr(args.delay)
+    api_url = f"http://127.0.0.1:{server.server_port}/api/v3"
+
+    service = ArrService()
+    service.api_url = api_url
+    service.api_key = "benchmark"
+
+    print(f"{args.chats} concurrent chats, {args.delay}s backend latency")
+    measure("blocking", args.chats, run_blocking(api_url, args.chats))
+    measure("async", args.chats, run_async(service, args.chats))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
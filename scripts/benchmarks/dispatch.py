@@ -0,0 +1,120 @@
+"""
+Measures the cost of dispatching button presses (callbacks) to service handlers.
+Compares the previous linear dispatch (shlex split per service, linear scan of the
+subcallbacks) against the dispatch tables built by @handler, with the quoted and
+the compact callback data. Run from the repository root:
+
+    python scripts/benchmarks/dispatch.py [--services 12] [--callbacks 16]
+"""
+
+import os
+import sys
+import time
+import shlex
+import random
+import asyncio
+import argparse
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+os.environ.setdefault("BUTLARR_CONFIG_FILE", "templates/config.yaml")
+
+from loguru import logger  # noqa: E402
+from butlarr.tg_handler import (  # noqa: E402
+    TelegramHandler,
+    callback,
+    handler,
+    get_clbk_handler,
+)
+from butlarr.tg_handler.callback_data import CALLBACK_CODEC, quote_clbk  # noqa: E402
+
+
+def create_service(name, n_callbacks):
+    methods = {}
+    # Every callback needs its own function, to be registered once
+    for i in range(n_callbacks):
+
+        async def clbk(self, update, context, args):
+            pass
+
+        methods[f"clbk_{i}"] = callback(cmds=[f"action{i}"])(clbk)
+    cls = handler(type(name, (TelegramHandler,), methods))
+    service = cls()
+    service.commands = [name]
+    return service
+
+
+def get_previous_clbk_handler(services):
+    # The dispatch before the dispatch tables, kept for comparison
+    async def handle_callback(s, update, context):
+        args = shlex.split(update.callback_query.data.strip())
+        if args[0] != s.commands[0]:
+            return
+        for cmd, c in s.sub_callbacks:
+            if args[1] == cmd:
+                await c(s, update, context, args[1:])
+                return
+
+    async def handler(update, context):
+        args = shlex.split(update.callback_query.data.strip())
+        for s in services:
+            if args[0] == s.commands[0]:
+                return await handle_callback(s, update, context)
+
+    return handler
+
+
+async def measure(name, dispatch, updates):
+    started = time.perf_counter()
+    for update in updates:
+        await dispatch(update, None)
+    duration = time.perf_counter() - started
+    print(f"{name:>10}: {duration / len(updates) * 1e6:7.2f}us per callback")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--services", type=int, default=12)
+    parser.add_argument("--callbacks", type=int, default=16)
+    parser.add_argument("--presses", type=int, default=50000)
+    args = parser.parse_args()
+    logger.remove()
+
+    services = [
+        create_service(f"service{i}", args.callbacks) for i in range(args.services)
+    ]
+    presses = [
+        (
+            random.choice(services).commands[0],
+            f"action{random.randrange(args.callbacks)}",
+            random.randrange(100),
+        )
+        for _ in range(args.presses)
+    ]
+
+    def get_updates(encode):
+        return [
+            SimpleNamespace(callback_query=SimpleNamespace(data=encode(list(p))))
+            for p in presses
+        ]
+
+    print(f"{args.services} services with {args.callbacks} callbacks each")
+    quoted = get_updates(quote_clbk)
+    asyncio.run(measure("previous", get_previous_clbk_handler(services), quoted))
+    asyncio.run(measure("tables", get_clbk_handler(services).callback, quoted))
+
+    for service in services:
+        CALLBACK_CODEC.register(service)
+    started = time.perf_counter()
+    compact = get_updates(CALLBACK_CODEC.encode)
+    duration = time.perf_counter() - started
+    print(f"{'encode':>10}: {duration / len(presses) * 1e6:7.2f}us per callback")
+    asyncio.run(measure("compact", get_clbk_handler(services).callback, compact))
+
+    for name, updates in [("quoted", quoted), ("compact", compact)]:
+        size = sum(len(u.callback_query.data) for u in updates) / len(updates)
+        print(f"{name:>10}: {size:5.1f} bytes per callback")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Measures peak RSS while loading a large library, parsing the whole response at
+once (ArrService.list_) versus streaming it item by item (ArrService.stream_library).
+Run from the repository root:
+
+    python scripts/benchmarks/library_memory.py [--items 9000]
+
+Reads the peak rss from /proc, so it only runs on Linux.
+"""
+
+import os
+import sys
+import json
+import random
+import asyncio
+import argparse
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+os.environ.setdefault("BUTLARR_CONFIG_FILE", "templates/config.yaml")
+
+
+def create_library(size):
+    words = ["dune", "alien", "matrix", "heat", "up", "jaws", "rocky", "cars"]
+    return [
+        {
+            "id": i,
+            "title": " ".join(random.choices(words, k=3)),
+            "year": 1950 + i % 75,
+            "overview": "Lorem ipsum dolor sit amet. " * 20,
+            "images": [
+                {"coverType": t, "url": f"/{i}/{t}.jpg", "remoteUrl": f"http://x/{t}"}
+                for t in ["poster", "fanart", "banner"]
+            ],
+            "movieFile": {"mediaInfo": {"audioCodec": "AAC" * 50}, "size": 1 << 30},
+            "ratings": {"imdb": {"votes": 1000, "value": 7.5}},
+            "genres": ["Action", "Drama", "Sci-Fi"],
+        }
+        for i in range(1, size + 1)
+    ]
+
+
+def start_fake_arr(body):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def peak_rss_mb():
+    # VmHWM, unlike ru_maxrss, is not inherited from the forking parent
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+
+
+async def load(mode, api_url):
+    from butlarr.services import ArrVariant
+    from butlarr.services.radarr import Radarr
+
+    service = Radarr(commands=["movie"], api_host="", api_key="benchmark")
+    service.api_url = api_url
+    service.arr_variant = ArrVariant.RADARR
+    if mode == "json":
+        items = await service.list_()
+    else:
+        items = [item async for item in service.stream_library()]
+    return len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=9000)
+    parser.add_argument("--mode", choices=["json", "stream"])
+    parser.add_argument("--api-url")
+    args = parser.parse_args()
+
+    if args.mode:
+        import butlarr.services.radarr  # noqa: F401
+
+        baseline = peak_rss_mb()
+        count = asyncio.run(load(args.mode, args.api_url))
+        peak = peak_rss_mb()
+        print(f"{args.mode:<8} {count} items  peak rss {peak:.1f} MB (+{peak - baseline:.1f} MB)")
+        return
+
+    body = json.dumps(create_library(args.items)).encode()
+    server = start_fake_arr(body)
+    api_url = f"http://127.0.0.1:{server.server_port}/api/v3"
+    print(f"{args.items} items, {len(body) / 1024 / 1024:.1f} MB response")
+    for mode in ["json", "stream"]:
+        # Separate processes, as the peak rss of a process never decreases
+        subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--api-url", api_url],
+            stderr=subprocess.DEVNULL,
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
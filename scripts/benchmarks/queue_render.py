@@ -0,0 +1,128 @@
+"""
+Measures rendering the MarkdownV2 lines of queue pages. Compares the previous
+implementation (f-strings, escaping with one str.replace pass per special character)
+against the QueueRenderer (replacing only present characters, precompiled templates,
+escaped titles and statuses cached per record id). A str.translate table is measured
+as well, as it is slower than both on CPython. Run from the repository root:
+
+    python scripts/benchmarks/queue_render.py [--records 250] [--polls 200]
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+os.environ.setdefault("BUTLARR_CONFIG_FILE", "templates/config.yaml")
+
+from loguru import logger  # noqa: E402
+from butlarr.config.queue import WIDTH  # noqa: E402
+from butlarr.services.queue_render import QueueRenderer  # noqa: E402
+from butlarr.tg_handler.markdown import escape_markdownv2_chars  # noqa: E402
+
+MARKDOWNV2_CHARS = "_*[]()~`#+-=|{}.!"
+MARKDOWNV2_TABLE = str.maketrans({c: rf"\{c}" for c in MARKDOWNV2_CHARS})
+
+
+def previous_escape_markdownv2_chars(text: str):
+    # The previous escaping, kept for comparison
+    for c in MARKDOWNV2_CHARS:
+        text = text.replace(c, rf"\{c}")
+    return text
+
+
+def render_previous(records, offset=1):
+    # The queue lines before the QueueRenderer, kept for comparison
+    escape = previous_escape_markdownv2_chars
+    lines = []
+    for idx, item in enumerate(records):
+        percent = 1.0 - (float(item.get("sizeleft", 0)) / (item.get("size") or 1))
+        progress = math.floor(percent * WIDTH)
+        remaining = math.ceil((1.0 - percent) * WIDTH)
+
+        title = escape(item.get("title", "")[0 : 2 * WIDTH])
+        title_ln = rf"{offset + idx}\. *{title}*"
+        progress_ln = rf">`[{progress * '='}|{(remaining*' ')}]` {round(percent*100)}%"
+        status_ln = rf">Status: _{escape(item.get('status', 'N/A'))}_ \(_{escape(item.get('trackedDownloadState', '-'))}_\)   Time left: _{escape(item.get('timeleft', 'N/A'))}_"
+        lines += [title_ln, progress_ln, status_ln]
+    return lines
+
+
+def render_current(renderer, records, offset=1):
+    lines = []
+    for idx, item in enumerate(records):
+        lines += renderer.render(item, offset + idx)
+    return lines
+
+
+def create_records(n):
+    return [
+        {
+            "id": i,
+            "title": f"Some.Release.Name.S01E{i:02d}.1080p.WEB-DL.DDP5.1.H.264-[GROUP]",
+            "status": random.choice(["downloading", "queued", "paused"]),
+            "trackedDownloadState": random.choice(["downloading", "importPending"]),
+            "size": 4_000_000_000,
+            "sizeleft": random.randrange(4_000_000_000),
+            "timeleft": f"00:{random.randrange(60):02d}:{random.randrange(60):02d}",
+        }
+        for i in range(n)
+    ]
+
+
+def poll(records):
+    # Between polls only the progress and the time left change
+    return [
+        {**r, "sizeleft": max(0, r["sizeleft"] - 10_000_000), "timeleft": "00:01:00"}
+        for r in records
+    ]
+
+
+def measure(name, render, pages):
+    started = time.perf_counter()
+    for records in pages:
+        render(records)
+    duration = time.perf_counter() - started
+    n = sum(len(records) for records in pages)
+    print(f"{name:>10}: {duration / n * 1e6:7.2f}us per record")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=250)
+    parser.add_argument("--polls", type=int, default=200)
+    args = parser.parse_args()
+    logger.remove()
+
+    pages = [create_records(args.records)]
+    for _ in range(args.polls - 1):
+        pages.append(poll(pages[-1]))
+
+    renderer = QueueRenderer()
+    for records in pages[:5]:
+        assert render_previous(records) == render_current(renderer, records)
+
+    texts = [r[k] for records in pages for r in records for k in ["title", "status"]]
+    for text in texts[:100]:
+        assert previous_escape_markdownv2_chars(text) == escape_markdownv2_chars(text)
+    for name, escape in [
+        ("replace", previous_escape_markdownv2_chars),
+        ("translate", lambda text: text.translate(MARKDOWNV2_TABLE)),
+        ("present", escape_markdownv2_chars),
+    ]:
+        started = time.perf_counter()
+        for text in texts:
+            escape(text)
+        duration = time.perf_counter() - started
+        print(f"{name:>10}: {duration / len(texts) * 1e6:7.2f}us per escape")
+
+    measure("previous", render_previous, pages)
+    renderer = QueueRenderer()
+    measure("renderer", lambda records: render_current(renderer, records), pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Measures the cost of rendering a movie card (keyboard and caption) per button press.
+Replays random navigation and menu presses against create_message, once without
+and once with the render cache. Run from the repository root:
+
+    python scripts/benchmarks/rendering.py [--items 20] [--profiles 8]
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from dataclasses import replace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+os.environ.setdefault("BUTLARR_CONFIG_FILE", "templates/config.yaml")
+
+from loguru import logger  # noqa: E402
+from butlarr.services.radarr import Radarr  # noqa: E402
+from butlarr.tg_handler.render_cache import RENDER_CACHE  # noqa: E402
+from butlarr.tg_handler.callback_data import CALLBACK_CODEC  # noqa: E402
+
+
+def create_items(n):
+    return [
+        {
+            "id": i if i % 3 == 0 else None,
+            "title": f"Movie {i}",
+            "year": 2000 + i,
+            "runtime": 90 + i,
+            "status": "released",
+            "overview": "An overview of the movie. " * 20,
+            "remotePoster": f"https://image.tmdb.org/t/p/original/{i}.jpg",
+            "tmdbId": 1000 + i,
+            "imdbId": f"tt{1000 + i}",
+            "monitored": True,
+            "hasFile": i % 2 == 0,
+        }
+        for i in range(n)
+    ]
+
+
+def create_service(n_profiles):
+    service = Radarr(commands=["movie"], api_host="http://localhost", api_key="-")
+    service.root_folders = [
+        {"id": i, "path": f"/data/movies/{i}"} for i in range(n_profiles)
+    ]
+    service.quality_profiles = [
+        {"id": i, "name": f"Profile {i}"} for i in range(n_profiles)
+    ]
+    service.metadata_version = 1
+    CALLBACK_CODEC.register(service)
+    return service
+
+
+async def measure(name, service, states):
+    started = time.perf_counter()
+    for state in states:
+        await service.create_message(state, allow_edit=True)
+    duration = time.perf_counter() - started
+    print(f"{name:>10}: {duration / len(states) * 1e6:7.2f}us per callback")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--profiles", type=int, default=8)
+    parser.add_argument("--presses", type=int, default=20000)
+    args = parser.parse_args()
+    logger.remove()
+
+    service = create_service(args.profiles)
+    initial = service._get_initial_state(create_items(args.items))
+    # Users mostly navigate, sometimes open the add menu and its submenus
+    states = [
+        replace(
+            initial,
+            index=random.randrange(args.items),
+            menu=random.choice([None] * 6 + ["add", "path", "quality"]),
+        )
+        for _ in range(args.presses)
+    ]
+
+    RENDER_CACHE.max_size = 0
+    asyncio.run(measure("uncached", service, states))
+    RENDER_CACHE.max_size = 1024
+    asyncio.run(measure("cached", service, states))
+    print(f"{'hit rate':>10}: {RENDER_CACHE.stats.hits / len(states) / 2:7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures build time, full resync time (as done by every full library sync),
+incremental update time and query latency of the library search index used by
+the `find` subcommand. Run from the repository root:
+
+    python scripts/benchmarks/search_index.py [--sizes 10000 50000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+os.environ.setdefault("BUTLARR_CONFIG_FILE", "templates/config.yaml")
+
+from butlarr.services.search import SearchIndex  # noqa: E402
+
+WORDS = (
+    "the a of dark night star wars lord rings return king dune alien matrix "
+    "house dragon blade runner lost city river storm island winter summer "
+    "black white red blue golden silent last first great little big secret"
+).split()
+QUERIES = ["dark night", "lord of the rings", "dune 2021", "blade runr", "silnt river"]
+
+
+def create_library(size):
+    random.seed(size)
+    return {
+        i: {
+            "id": i,
+            "title": " ".join(random.choices(WORDS, k=random.randint(1, 4))).title(),
+            "alternateTitles": [
+                {"title": " ".join(random.choices(WORDS, k=2))}
+                for _ in range(random.randint(0, 2))
+            ],
+            "year": random.randint(1950, 2024),
+        }
+        for i in range(1, size + 1)
+    }
+
+
+def measure(size, rounds=50):
+    items = create_library(size)
+    index = SearchIndex()
+
+    start = time.perf_counter()
+    index.sync(items)
+    build = time.perf_counter() - start
+
+    # Full syncs pass fresh copies of mostly unchanged items
+    copies = {id: dict(item) for id, item in items.items()}
+    start = time.perf_counter()
+    index.sync(copies)
+    resync = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for id in random.sample(list(items), 100):
+        index.add(id, {**items[id], "title": items[id]["title"] + " Returns"})
+    update = (time.perf_counter() - start) / 100
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for q in QUERIES:
+            index.search(q)
+    query = (time.perf_counter() - start) / (rounds * len(QUERIES))
+
+    print(
+        f"{size:>7} items  build {build:7.3f}s  resync {resync:7.3f}s  "
+        f"update {update * 1e6:7.1f}us  query {query * 1e3:7.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    args = parser.parse_args()
+    for size in args.sizes:
+        measure(size)
+
+
+if __name__ == "__main__":
+    main()
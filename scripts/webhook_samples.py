@@ -0,0 +1,62 @@
+"""
+Posts sample Radarr/Sonarr webhook payloads to a running butlarr, standing in for
+a real arr "Webhook" connection. Run from the repository root:
+
+    python scripts/webhook_samples.py --url "http://localhost:8880/webhook/movie?token=<secret>" Download
+    python scripts/webhook_samples.py --url http://localhost:8880/webhook/series --variant series Grab Delete
+"""
+
+import json
+import argparse
+import urllib.request
+
+ITEMS = {
+    "movie": {"id": 1, "title": "Blade Runner", "year": 1982, "tmdbId": 78},
+    "series": {"id": 1, "title": "The Expanse", "year": 2015, "tvdbId": 280619},
+}
+EPISODES = [{"id": 1, "seasonNumber": 1, "episodeNumber": 2, "title": "The Big Empty"}]
+
+
+def get_payload(variant, event):
+    movie = variant == "movie"
+    payload = {"eventType": event, variant: ITEMS[variant]}
+    if not movie:
+        payload["episodes"] = EPISODES
+    if event == "Grab":
+        payload["release"] = {"quality": "Bluray-1080p", "releaseTitle": "Sample"}
+    elif event in ["Download", "Upgrade"]:
+        payload["eventType"] = "Download"
+        payload["isUpgrade"] = event == "Upgrade"
+        payload["movieFile" if movie else "episodeFile"] = {"quality": "Bluray-1080p"}
+    elif event == "Delete":
+        payload["eventType"] = "MovieDelete" if movie else "SeriesDelete"
+    elif event == "FileDelete":
+        payload["eventType"] = "MovieFileDelete" if movie else "EpisodeFileDelete"
+    return payload
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8880/webhook/movie")
+    parser.add_argument("--variant", choices=list(ITEMS), default="movie")
+    parser.add_argument(
+        "events",
+        nargs="+",
+        choices=["Test", "Grab", "Download", "Upgrade", "Delete", "FileDelete"],
+    )
+    args = parser.parse_args()
+
+    for event in args.events:
+        payload = get_payload(args.variant, event)
+        request = urllib.request.Request(
+            args.url,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request) as response:
+            print(f"{event}: {response.status}")
+
+
+if __name__ == "__main__":
+    main()
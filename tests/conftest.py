@@ -0,0 +1,7 @@
+import os
+
+# The config is loaded on import, use the bundled template
+os.environ.setdefault(
+    "BUTLARR_CONFIG_FILE",
+    os.path.join(os.path.dirname(__file__), "..", "templates", "config.yaml"),
+)
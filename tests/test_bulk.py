@@ -0,0 +1,29 @@
+import asyncio
+from dataclasses import replace
+
+from butlarr.services.radarr import Radarr
+
+
+def create_state(service):
+    items = [{"id": 1, "title": "Dune"}, {"id": None, "title": "Arrival"}]
+    return replace(
+        service._get_initial_state(items),
+        selected=[0, 1],
+        quality_profile={"id": 4, "name": "HD"},
+        root_folder={"id": 1, "path": "/movies"},
+    )
+
+
+def test_bulk_add_args():
+    service = Radarr(commands=["movie"], api_host="http://localhost", api_key="-")
+    args = service.get_bulk_add_args(create_state(service))
+    assert args["quality_profile_id"] == 4
+    assert args["root_folder_path"] == "/movies"
+    assert "options" in args
+
+
+def test_unknown_bulk_edit():
+    service = Radarr(commands=["movie"], api_host="http://localhost", api_key="-")
+    state = create_state(service)
+    reply = asyncio.run(service.bulk_update(state, ["bulkedit", "unknown"]))
+    assert reply == "Seems like something went wrong..."
@@ -0,0 +1,49 @@
+import asyncio
+
+import httpx
+import pytest
+
+from butlarr.services.breaker import BreakerState, CircuitBreaker
+from butlarr.services.client import ArrClient
+
+
+def create_client(status_code=200):
+    def handle(request):
+        return httpx.Response(status_code, content=b"[1, 2, 3]")
+
+    breaker = CircuitBreaker("http://arr", reset_timeout=0)
+    # Half open, so that the stream is the single probe request
+    breaker.state = BreakerState.OPEN
+    client = ArrClient(breaker=breaker)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+    return client, breaker
+
+
+async def read(client, stop_early=False):
+    chunks = client.stream("GET", "http://arr/api")
+    try:
+        async for _ in chunks:
+            if stop_early:
+                break
+    finally:
+        await chunks.aclose()
+
+
+def test_stream_success():
+    client, breaker = create_client()
+    asyncio.run(read(client))
+    assert breaker.state == BreakerState.CLOSED
+
+
+def test_stream_closed_early_releases_probe():
+    client, breaker = create_client()
+    asyncio.run(read(client, stop_early=True))
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert not breaker.probing
+
+
+def test_stream_server_error():
+    client, breaker = create_client(503)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(read(client))
+    assert breaker.state == BreakerState.OPEN
@@ -0,0 +1,23 @@
+from butlarr.services.radarr import Radarr
+
+
+def create_item(**kwargs):
+    return {
+        "tmdbId": 1,
+        "title": "Dune",
+        "year": 2021,
+        "runtime": 155,
+        "status": "released",
+        "overview": "A noble family.",
+        **kwargs,
+    }
+
+
+def test_caption_changes_with_item():
+    service = Radarr(commands=["movie"], api_host="http://localhost", api_key="-")
+    assert "A noble family." in service.get_caption(create_item())
+    assert "A desert planet." in service.get_caption(
+        create_item(overview="A desert planet.")
+    )
+    assert "156min" in service.get_caption(create_item(runtime=156))
+    assert "(2020)" in service.get_caption(create_item(year=2020))
@@ -0,0 +1,25 @@
+from butlarr.services.search import SearchIndex
+
+
+def create_index():
+    index = SearchIndex()
+    index.sync(
+        {
+            1: {"title": "1917", "year": 2019},
+            2: {"title": "Nineteen Eighty-Four", "year": 1984},
+            3: {"title": "1984", "year": 1956},
+            4: {"title": "Dune", "year": 2021},
+        }
+    )
+    return index
+
+
+def test_year_only_title():
+    index = create_index()
+    assert index.search("1917")[0] == 1
+    assert index.search("1984")[0] == 3
+
+
+def test_year_narrows_title():
+    index = create_index()
+    assert index.search("dune 2021") == [4]
@@ -0,0 +1,44 @@
+import time
+import asyncio
+
+from butlarr.tg_handler.send_queue import SendQueue, GROUP_BURST
+
+GROUP = -1001234
+
+
+async def request(queue, endpoint, **data):
+    async def callback():
+        return endpoint
+
+    return await queue.process_request(
+        callback, [], {}, endpoint, {"chat_id": GROUP, **data}, None
+    )
+
+
+async def edits_after_sends():
+    queue = SendQueue()
+    await queue.initialize()
+    try:
+        # Uses up the burst of the 20 per minute group bucket
+        for _ in range(GROUP_BURST):
+            await request(queue, "sendMessage", text="-")
+
+        started = time.monotonic()
+        for _ in range(2):
+            await request(queue, "editMessageText", message_id=1, text="-")
+            await request(queue, "editMessageMedia", message_id=1)
+        edits = time.monotonic() - started
+
+        started = time.monotonic()
+        await request(queue, "sendMessage", text="-")
+        send = time.monotonic() - started
+        return edits, send
+    finally:
+        await queue.shutdown()
+
+
+def test_edits_not_throttled_by_group_sends():
+    edits, send = asyncio.run(edits_after_sends())
+    assert edits < 0.5
+    # The next message still waits for the group bucket
+    assert send > 1
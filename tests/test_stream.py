@@ -0,0 +1,36 @@
+import json
+import asyncio
+
+import pytest
+
+from butlarr.services.stream import iter_json_array
+
+
+async def collect(chunks):
+    async def iter_chunks():
+        for chunk in chunks:
+            yield chunk.encode()
+
+    return [item async for item in iter_json_array(iter_chunks())]
+
+
+def parse(chunks):
+    return asyncio.run(collect(chunks))
+
+
+def test_number_split_across_chunks():
+    assert parse(["[1", "23, 4]"]) == [123, 4]
+    assert parse(["[1.", "5e", "3 ", " ,-", "2]"]) == [1500.0, -2]
+
+
+def test_every_split():
+    text = json.dumps([{"title": "Dune", "year": 2021}, 12345, "Dune", None, 1.25])
+    for i in range(len(text)):
+        assert parse([text[:i], text[i:]]) == json.loads(text)
+
+
+def test_invalid_arrays():
+    with pytest.raises(ValueError):
+        parse(["[1, 2"])
+    with pytest.raises(ValueError):
+        parse(["[1 2]"])